@@ -1,28 +1,263 @@
+import cProfile
+import contextvars
+import functools
+import hashlib
+import hmac
+import inspect
+import json
+import os
+import pickle
+import pstats
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from types import MappingProxyType
+
+import diskcache
+import numpy as np
 import pandas as pd
 import plotly.express as px
-from dash import Dash, html, dcc, dash_table, Input, Output, State
+import psutil
+from dash import Dash, DiskcacheManager, ctx, html, dcc, dash_table, Input, Output, State, no_update
+from dash.exceptions import MissingCallbackContextException
 
 import requests
+from flask import Response, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from requests.adapters import HTTPAdapter
 
-app = Dash(__name__)
+cache_dir = os.environ.get('DASHBOARD_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'dashboard-zeroum'))
+# Cached Graph responses and loaded datasets hold client data, so other local users cannot read them.
+os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+background_callback_manager = DiskcacheManager(diskcache.Cache(os.path.join(cache_dir, 'jobs')))
+
+app = Dash(__name__, background_callback_manager=background_callback_manager)
 app.title = 'Zero Um Company - MetaAds Dashboard'
 app._favicon = ("logo.png")
 server = app.server
 
-url_default = 'https://graph.facebook.com/v19.0/'
-cliente = ''
+url_default = os.environ.get('DASHBOARD_GRAPH_URL', 'https://graph.facebook.com/v19.0/')
 insights = '/insights?'
-token = ''
-params = {
+# Shared by every session, so it is read-only; build_insights_params makes the per-call copy.
+params = MappingProxyType({
     'level': 'adset',
     'fields': 'campaign_name,adset_name,adset_id,spend,cpc,ctr,clicks,impressions,reach,actions,frequency',
-    'access_token': token
+})
+# Insights fields each checklist item needs; campaign and adset names are always requested.
+insights_identity_fields = ['campaign_name', 'adset_name', 'adset_id']
+metric_fields = {
+    'spend': ['spend'],
+    'total_msg': ['actions'],
+    'cost_per_msg': ['spend', 'actions'],
+    'funnel': ['spend', 'actions'],
+    'reach': ['reach'],
+    'impressions': ['impressions'],
+    'frequency': ['impressions', 'reach'],
+    'CTR': ['impressions', 'actions'],
+    'clicks_link': ['actions'],
+    'cost_click': ['spend', 'actions'],
+    'engagement': ['actions'],
+    'cost_engagement': ['spend', 'actions'],
+    'table': [*params['fields'].split(','), 'targeting'],
+}
+field_missing_message = 'Clique em Enviar'
+insights_page_size = 500
+targeting_batch_size = 50
+gender_labels = {(1,): 'Masculino', (2,): 'Feminino'}
+metric_base_columns = ['spend', 'messaging_conversation_started_7d', 'impressions', 'reach', 'link_click', 'page_engagement']
+ingest_schema = {
+    'campaign_name': 'category',
+    'adset_name': 'category',
+    'spend': 'float64',
+    'cpc': 'float64',
+    'ctr': 'float64',
+    'frequency': 'float64',
+    'clicks': 'int32',
+    'impressions': 'int32',
+    'reach': 'int32',
+    'link_click': 'int32',
+    'page_engagement': 'int32',
+    'post_save': 'int32',
+    'messaging_conversation_started_7d': 'int32',
+    'age_min': 'float32',
+    'age_max': 'float32',
+    'gender': 'category',
+}
+ingest_text_columns = ['campaign_name', 'adset_name', 'adset_id', 'gender', 'date_start', 'date_stop']
+# The adset table only ships the visible page of these columns.
+table_columns = [
+    ('campaign_name', 'Campanha', 'text'),
+    ('adset_name', 'Conjunto de Anúncios', 'text'),
+    ('date_start', 'Início', 'text'),
+    ('date_stop', 'Fim', 'text'),
+    ('spend', 'Valor Gasto (R$)', 'numeric'),
+    ('impressions', 'Impressões', 'numeric'),
+    ('reach', 'Alcance', 'numeric'),
+    ('frequency', 'Frequência', 'numeric'),
+    ('clicks', 'Cliques', 'numeric'),
+    ('ctr', 'CTR (%)', 'numeric'),
+    ('cpc', 'CPC (R$)', 'numeric'),
+    ('link_click', 'Cliques no Link', 'numeric'),
+    ('page_engagement', 'Engajamento', 'numeric'),
+    ('messaging_conversation_started_7d', 'Conversas Iniciadas', 'numeric'),
+    ('age_min', 'Idade Mínima', 'numeric'),
+    ('age_max', 'Idade Máxima', 'numeric'),
+    ('gender', 'Gênero', 'text'),
+]
+# Field behind each table column that a presentation-mode load can leave out.
+table_column_fields = {
+    'spend': 'spend',
+    'impressions': 'impressions',
+    'reach': 'reach',
+    'frequency': 'frequency',
+    'clicks': 'clicks',
+    'ctr': 'ctr',
+    'cpc': 'cpc',
+    'link_click': 'actions',
+    'page_engagement': 'actions',
+    'messaging_conversation_started_7d': 'actions',
+    'age_min': 'targeting',
+    'age_max': 'targeting',
+    'gender': 'targeting',
+}
+timeseries_fields = 'campaign_name,adset_name,adset_id,spend,actions'
+timeseries_metrics = {
+    'spend': ('spend', 'Investimento (R$)'),
+    'total_msg': ('messaging_conversation_started_7d', 'Conversas Iniciadas'),
 }
+timeseries_levels = {
+    'campaign': ('campaign_name', 'Campanha'),
+    'adset': ('adset_name', 'Conjunto de Anúncios'),
+}
+# Points sent to the browser across all series; each series keeps at least timeseries_min_points.
+timeseries_point_budget = 20000
+timeseries_min_points = 60
+timeseries_webgl_points = 1000
+timeseries_legend_limit = 30
+timeseries_chunk_days = 31
+timeseries_columns = ['date_start', 'campaign_name', 'adset_name', 'spend', 'messaging_conversation_started_7d']
+portfolio_fields = 'account_name,spend,impressions,reach,actions'
+portfolio_columns = [
+    ('rank', '#', 'numeric'),
+    ('account_name', 'Conta', 'text'),
+    ('spend', 'Investimento (R$)', 'numeric'),
+    ('spend_share', '% do Investimento', 'numeric'),
+    ('total_msg', 'Conversas Iniciadas', 'numeric'),
+    ('cost_per_msg', 'Custo por Conversa (R$)', 'numeric'),
+    ('impressions', 'Impressões', 'numeric'),
+    ('reach', 'Alcance', 'numeric'),
+    ('ctr', 'CTR (%)', 'numeric'),
+    ('clicks_link', 'Cliques no Link', 'numeric'),
+    ('cost_click', 'Custo por Clique (R$)', 'numeric'),
+    ('engagement', 'Engajamento', 'numeric'),
+    ('cost_engagement', 'Custo por Engajamento (R$)', 'numeric'),
+]
+table_filter_operators = [['ge ', '>='], ['le ', '<='], ['lt ', '<'], ['gt ', '>'], ['ne ', '!='], ['eq ', '='], ['contains '], ['datestartswith ']]
+
+http_timeout = (5, 60)
+http_pool_size = 16
+http_local = threading.local()
+http_sessions = weakref.WeakSet()
+http_sessions_lock = threading.Lock()
+
+client_options_ttl = 600
+client_options_limit = 200
+
+insights_store_path = os.environ.get('DASHBOARD_INSIGHTS_DB')
+insights_name_columns = ['campaign_name', 'adset_name']
+range_reach_fields = 'adset_id,reach'
+
+prefetch_token = os.environ.get('DASHBOARD_PREFETCH_TOKEN')
+prefetch_interval = int(os.environ.get('DASHBOARD_PREFETCH_INTERVAL', 6 * 3600))
+prefetch_max_accounts_in_flight = 4
+# How often each worker checks whether the interval's run is still unclaimed.
+prefetch_claim_poll_interval = 60
+prefetch_stop = threading.Event()
+
+report_poll_interval = 2
+report_timeout = 900
+report_running_status = ['Job Not Started', 'Job Started', 'Job Running']
+
+max_background_jobs = 4
+max_queued_jobs = 16
+background_job_poll_interval = 0.5
+
+max_in_flight_per_token = 4
+# Insights are throttled per ad account, so the portfolio runs one request per account and more accounts at once.
+max_portfolio_accounts_in_flight = 16
+fetch_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='graph-fetch')
+token_semaphores = {}
+token_semaphores_lock = threading.Lock()
+
+# Bounded by the pickled size of the cached responses (a 500-row insights page is about 160 KB); parsed, they take about
+# six times that, so this keeps roughly 50 MB per process. The shared cache on disk holds the rest.
+cache_max_bytes = 8 * 1024 * 1024
+cache_ttl_today = 300
+cache_ttl_targeting = 3600
+graph_cache = OrderedDict()
+graph_cache_lock = threading.Lock()
+graph_cache_bytes = 0
+# Background jobs run in their own processes, so fetched pages are also kept where every process can read them.
+shared_cache = diskcache.Cache(os.path.join(cache_dir, 'graph'), eviction_policy='least-recently-used', size_limit=512 * 1024 * 1024)
+
+# Background jobs run in forked processes, so their samples reach /metrics only through PROMETHEUS_MULTIPROC_DIR,
+# where every worker and job writes and /metrics sums them. gunicorn.conf.py sets it by default; without it
+# /metrics shows the worker's own samples alone.
+byte_buckets = (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024, float('inf'))
+callback_seconds = Histogram('dashboard_callback_seconds', 'Tempo de resposta de /_dash-update-component por callback', ['callback', 'request'])
+callback_response_bytes = Histogram('dashboard_callback_response_bytes', 'Tamanho da resposta de /_dash-update-component por callback', ['callback', 'request'], buckets=byte_buckets)
+background_job_seconds = Histogram('dashboard_background_job_seconds', 'Duração dos jobs em segundo plano, incluindo a fila', ['callback'], buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900, float('inf')))
+graph_requests = Counter('dashboard_graph_requests', 'Requisições à Graph API por função e resultado', ['helper', 'method', 'status', 'error_code'])
+graph_request_seconds = Histogram('dashboard_graph_request_seconds', 'Latência das requisições à Graph API por função', ['helper', 'method'])
+graph_response_bytes = Histogram('dashboard_graph_response_bytes', 'Tamanho das respostas da Graph API por função', ['helper', 'method'], buckets=byte_buckets)
+cache_lookups = Counter('dashboard_cache_lookups', 'Consultas ao cache da Graph API por resultado', ['result'])
+prefetch_runs = Counter('dashboard_prefetch_runs', 'Execuções do pré-carregamento')
+prefetch_failures = Counter('dashboard_prefetch_failures', 'Falhas do pré-carregamento, por conta ou na listagem de contas')
+prefetch_last_started = Gauge('dashboard_prefetch_last_started_timestamp', 'Início da última execução do pré-carregamento', multiprocess_mode='mostrecent')
+prefetch_last_duration = Gauge('dashboard_prefetch_last_duration_seconds', 'Duração da última execução do pré-carregamento', multiprocess_mode='mostrecent')
+prefetch_last_accounts = Gauge('dashboard_prefetch_last_accounts', 'Contas da última execução do pré-carregamento', multiprocess_mode='mostrecent')
+prefetch_last_failures = Gauge('dashboard_prefetch_last_failures', 'Falhas da última execução do pré-carregamento', multiprocess_mode='mostrecent')
+# Each worker reports the datasets it holds in memory; /metrics adds up the live workers.
+dataset_entries = Gauge('dashboard_dataset_entries', 'Datasets mantidos em memória', multiprocess_mode='livesum')
+dataset_memory_bytes = Gauge('dashboard_dataset_memory_bytes', 'Memória ocupada pelos datasets mantidos em memória', multiprocess_mode='livesum')
+
+# Opt-in profiling: DASHBOARD_PROFILE=1 profiles every callback, background jobs included; with
+# DASHBOARD_PROFILE_SECRET set, a request carrying it in the X-Dashboard-Profile header is profiled on its own,
+# together with the background job it starts.
+profile_all = os.environ.get('DASHBOARD_PROFILE') == '1'
+profile_secret = os.environ.get('DASHBOARD_PROFILE_SECRET')
+profile_header = 'X-Dashboard-Profile'
+profile_dir = os.environ.get('DASHBOARD_PROFILE_DIR', os.path.join(cache_dir, 'profiles'))
+profile_max_files = int(os.environ.get('DASHBOARD_PROFILE_MAX_FILES', 200))
+# Background jobs are forked from the thread serving the request, so they inherit its context and this decision.
+profile_request = contextvars.ContextVar('profile_request', default=profile_all)
+profile_phases = {
+    'fetch': ['get_insights_page', 'iter_insights_pages', 'iter_report_results', 'iter_stored_data', 'get_targeting_data', 'get_targeting_data_batch',
+              'get_client_options', 'get_client_list', 'start_report_run', 'get_report_run_status', 'get_portfolio_data', 'get_daily_frame'],
+    'normalize': ['append_page_data', 'process_page_buffers', 'process_data', 'process_page', 'finish_data', 'apply_ingest_schema', 'process_targeting_data'],
+    'aggregate': ['aggregate_daily_rows', 'compute_metrics', 'get_campaign_frame', 'get_table_page', 'build_daily_series', 'downsample_lttb', 'build_portfolio_records'],
+    'figure': ['generate_campaign_elements', 'build_pie_graph', 'build_funnel_graph', 'build_timeseries_graph', 'build_portfolio_graph'],
+}
+profile_phase_functions = {function_name: phase for phase, function_names in profile_phases.items() for function_name in function_names}
+
+dataset_max_entries = 32
+dataset_idle_ttl = 3600
+dataset_store_dir = os.environ.get('DASHBOARD_DATASET_DIR', os.path.join(cache_dir, 'datasets'))
+dataset_registry = OrderedDict()
+dataset_registry_lock = threading.Lock()
+background_job_process = False
 
 def generate_campaign_elements(df):
     campaign_elements = []
     
-    grouped_df = df.groupby('campaign_name')
+    grouped_df = df.groupby('campaign_name', observed=True)
     
     for campaign_name, group_df in grouped_df:
         campaign_elements.append(html.H3(f'CAMPANHA {campaign_name}', style={'margin-bottom': '10px', 'color': 'white', 'text-align': 'center'}))
@@ -30,32 +265,999 @@ def generate_campaign_elements(df):
             campaign_elements.append(html.H5(adset_name, style={'margin-bottom': '10px', 'color': 'white', 'text-align': 'center'}))
     return campaign_elements
 
-def get_updated_data(token_value, cliente_value, interval_type, start_date, end_date, single_date):
-    updated_url = url_default + cliente_value + insights
-    params['access_token'] = token_value
-    
+def build_insights_params(token_value, time_range=None, **extra_params):
+    request_params = dict(params, access_token=token_value, **extra_params)
+    if time_range is not None:
+        request_params['time_range'] = time_range
+    return MappingProxyType(request_params)
+
+def build_time_range(interval_type, start_date, end_date, single_date):
     if interval_type == 'range':
-        params['time_range'] = f'{{"since":"{start_date}","until":"{end_date}"}}'
+        return f'{{"since":"{start_date}","until":"{end_date}"}}'
     elif interval_type == 'single_day':
-        params['time_range'] = f'{{"since":"{single_date}","until":"{single_date}"}}'
-
-    updated_response = requests.get(updated_url, params=params)
-    updated_json_content = updated_response.json()
-
+        return f'{{"since":"{single_date}","until":"{single_date}"}}'
+    return None
+
+def get_insights_page(updated_url, page_params, cliente_value=None):
+    # Every parameter but the token and the fields is part of the query, so daily pages never answer for range totals.
+    query_key = ('insights', updated_url) + tuple(sorted((key, str(value)) for key, value in page_params.items() if key not in ('access_token', 'fields')))
+    fields = page_params.get('fields')
+    updated_json_content = cache_get(query_key + (fields,))
+    if updated_json_content is None and fields:
+        updated_json_content = get_wider_insights_page(query_key, fields)
+    # Cached pages are shared by every token, so a hit is served only to a token that lists the account.
+    if updated_json_content is not None and cliente_value is not None and not token_has_account(page_params['access_token'], cliente_value):
+        updated_json_content = None
+    if updated_json_content is None:
+        updated_response = graph_get('get_insights_page', updated_url, params=page_params)
+        updated_json_content = updated_response.json()
+        if not process_error(updated_json_content):
+            updated_json_content = compact_insights_page(updated_json_content)
+            ttl = get_insights_cache_ttl(page_params.get('time_range'))
+            cache_set(query_key + (fields,), updated_json_content, ttl)
+            if fields:
+                cached_fields = cache_get(('insights_fields',) + query_key) or []
+                cache_set(('insights_fields',) + query_key, [*cached_fields, fields], ttl)
     return updated_json_content
 
-def get_targeting_data(token_value, adset_id):
+def compact_insights_page(updated_json_content):
+    # Graph next links carry the access token; only whether there is a next page is kept.
+    paging = updated_json_content.get('paging', {})
+    compact_paging = {'cursors': paging.get('cursors', {})}
+    if paging.get('next'):
+        compact_paging['next'] = True
+    return {'data': updated_json_content.get('data', []), 'paging': compact_paging}
+
+def get_wider_insights_page(query_key, fields):
+    # A page fetched with more fields answers a narrower request only for the very same query parameters.
+    requested_fields = set(fields.split(','))
+    for cached_fields in cache_get(('insights_fields',) + query_key) or []:
+        if cached_fields != fields and requested_fields <= set(cached_fields.split(',')):
+            updated_json_content = cache_get(query_key + (cached_fields,))
+            if updated_json_content is not None:
+                return project_insights_page(updated_json_content, requested_fields)
+    return None
+
+def project_insights_page(updated_json_content, requested_fields):
+    kept_fields = requested_fields | {'date_start', 'date_stop'}
+    projected_rows = [{field: value for field, value in row.items() if field in kept_fields} for row in updated_json_content['data']]
+    return dict(updated_json_content, data=projected_rows)
+
+def build_insights_fields(metrics_value):
+    requested_fields = set(insights_identity_fields)
+    for metric in metrics_value:
+        requested_fields.update(metric_fields.get(metric, []))
+    return ','.join(field for field in params['fields'].split(',') if field in requested_fields)
+
+def get_missing_metrics(entry, metrics_value):
+    loaded_fields = set(entry['data'].attrs.get('fields', params['fields']).split(','))
+    return {metric for metric in metrics_value if not set(metric_fields.get(metric, [])) <= loaded_fields}
+
+def get_missing_table_columns(entry):
+    loaded_fields = set(entry['data'].attrs.get('fields', params['fields']).split(','))
+    return [column for column, field in table_column_fields.items() if field not in loaded_fields]
+
+def get_insights_cache_ttl(time_range):
+    if time_range is None:
+        return cache_ttl_today
+    until = date.fromisoformat(json.loads(time_range)['until'])
+    return None if until < date.today() else cache_ttl_today
+
+def iter_updated_data(token_value, cliente_value, interval_type, start_date, end_date, single_date, fields=None):
+    updated_url = url_default + cliente_value + insights
+    time_range = build_time_range(interval_type, start_date, end_date, single_date)
+    page_params = build_insights_params(token_value, time_range, limit=insights_page_size, fields=fields or params['fields'])
+    return iter_insights_pages(token_value, updated_url, page_params, cliente_value)
+
+def iter_insights_pages(token_value, updated_url, page_params, cliente_value=None):
+    semaphore = get_token_semaphore(token_value)
+    next_page = fetch_executor.submit(run_with_semaphore, semaphore, get_insights_page, (updated_url, page_params, cliente_value))
+    while next_page is not None:
+        updated_json_content = next_page.result()
+        next_page = None
+
+        # Request the following page before handing this one over, so it downloads while this one is parsed.
+        paging = updated_json_content.get('paging', {})
+        after = paging.get('cursors', {}).get('after')
+        if not process_error(updated_json_content) and paging.get('next') and after:
+            next_page = fetch_executor.submit(run_with_semaphore, semaphore, get_insights_page, (updated_url, MappingProxyType(dict(page_params, after=after)), cliente_value))
+
+        yield updated_json_content
+
+def start_report_run(token_value, cliente_value, interval_type, start_date, end_date, single_date, fields=None):
+    updated_url = url_default + cliente_value + insights
+    time_range = build_time_range(interval_type, start_date, end_date, single_date)
+    report_params = build_insights_params(token_value, time_range, fields=fields or params['fields'])
+    updated_response = graph_post('start_report_run', updated_url, params=report_params)
+    return updated_response.json()
+
+def get_report_run_status(token_value, report_run_id):
+    params_status = {
+        'access_token': token_value,
+        'fields': 'async_status,async_percent_completion'
+    }
+    updated_response = graph_get('get_report_run_status', url_default + report_run_id, params=params_status)
+    return updated_response.json()
+
+def iter_report_results(token_value, report_run_id):
+    page_params = MappingProxyType({'access_token': token_value, 'limit': insights_page_size})
+    return iter_insights_pages(token_value, url_default + report_run_id + insights, page_params)
+
+def connect_insights_store():
+    connection = sqlite3.connect(insights_store_path, timeout=30)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('CREATE TABLE IF NOT EXISTS insights_daily (account_id TEXT, day TEXT, adset_id TEXT, row TEXT, PRIMARY KEY (account_id, day, adset_id))')
+    connection.execute('CREATE TABLE IF NOT EXISTS insights_days (account_id TEXT, day TEXT, fields TEXT, fetched_at REAL, PRIMARY KEY (account_id, day))')
+    return connection
+
+def iter_stored_data(token_value, cliente_value, interval_type, start_date, end_date, single_date):
+    since = date.fromisoformat((start_date if interval_type == 'range' else single_date)[:10])
+    until = date.fromisoformat((end_date if interval_type == 'range' else single_date)[:10])
+    days = [since + timedelta(days=offset) for offset in range((until - since).days + 1)]
+
+    connection = connect_insights_store()
+    try:
+        stored_days = {row[0] for row in connection.execute(
+            'SELECT day FROM insights_days WHERE account_id = ? AND day BETWEEN ? AND ? AND fields = ?',
+            (cliente_value, since.isoformat(), until.isoformat(), params['fields']))}
+        # Stored days are shared by every token, so a token that does not list the account fetches them all itself.
+        if stored_days and not token_has_account(token_value, cliente_value):
+            stored_days = set()
+
+        # Days that are not stored yet, and today, which is still changing, are fetched in contiguous gaps.
+        missing_days = [day for day in days if day.isoformat() not in stored_days or day >= date.today()]
+        for gap_since, gap_until in group_contiguous_days(missing_days):
+            gap_rows = []
+            for updated_json_content in iter_daily_data(token_value, cliente_value, gap_since, gap_until):
+                if process_error(updated_json_content):
+                    yield updated_json_content
+                    return
+                gap_rows.extend(updated_json_content['data'])
+            # A row spanning several days would be stored as that whole range under its first day, and never refetched.
+            if any(row.get('date_start') != row.get('date_stop') for row in gap_rows):
+                yield {'error': {'message': 'A Graph API não devolveu dados diários'}}
+                return
+            save_daily_rows(connection, cliente_value, gap_since, gap_until, gap_rows)
+
+        stored_rows = [json.loads(row[0]) for row in connection.execute(
+            'SELECT row FROM insights_daily WHERE account_id = ? AND day BETWEEN ? AND ?',
+            (cliente_value, since.isoformat(), until.isoformat()))]
+    finally:
+        connection.close()
+
+    # Reach counts unique people and cannot be summed over days, so a range asks Graph for it over the whole range.
+    range_reach = {}
+    if since < until and stored_rows:
+        for updated_json_content in iter_updated_data(token_value, cliente_value, 'range', since.isoformat(), until.isoformat(), None, range_reach_fields):
+            if process_error(updated_json_content):
+                yield updated_json_content
+                return
+            range_reach.update((row['adset_id'], row.get('reach')) for row in updated_json_content['data'])
+
+    yield {'data': aggregate_daily_rows(stored_rows, since, until, range_reach)}
+
+def iter_daily_data(token_value, cliente_value, since, until, fields=None):
+    time_range = f'{{"since":"{since.isoformat()}","until":"{until.isoformat()}"}}'
+    page_params = build_insights_params(token_value, time_range, limit=insights_page_size, time_increment=1, fields=fields or params['fields'])
+    return iter_insights_pages(token_value, url_default + cliente_value + insights, page_params, cliente_value)
+
+def group_contiguous_days(days):
+    gaps = []
+    for day in days:
+        if gaps and gaps[-1][1] + timedelta(days=1) == day:
+            gaps[-1][1] = day
+        else:
+            gaps.append([day, day])
+    return gaps
+
+def save_daily_rows(connection, cliente_value, since, until, daily_rows):
+    with connection:
+        connection.execute('DELETE FROM insights_daily WHERE account_id = ? AND day BETWEEN ? AND ?', (cliente_value, since.isoformat(), until.isoformat()))
+        connection.executemany(
+            'INSERT OR REPLACE INTO insights_daily (account_id, day, adset_id, row) VALUES (?, ?, ?, ?)',
+            [(cliente_value, row['date_start'], row['adset_id'], json.dumps(row)) for row in daily_rows])
+        finished_days = [since + timedelta(days=offset) for offset in range((until - since).days + 1)]
+        connection.executemany(
+            'INSERT OR REPLACE INTO insights_days (account_id, day, fields, fetched_at) VALUES (?, ?, ?, ?)',
+            [(cliente_value, day.isoformat(), params['fields'], time.time()) for day in finished_days if day < date.today()])
+
+def aggregate_daily_rows(daily_rows, since, until, range_reach=None):
+    if not daily_rows:
+        return []
+
+    daily_df = process_page({'data': daily_rows})
+    daily_df = daily_df.drop(columns=['cpc', 'ctr', 'frequency', 'date_start', 'date_stop'], errors='ignore')
+    sum_columns = [column for column in daily_df.columns if column not in ['adset_id', *insights_name_columns]]
+    daily_df[sum_columns] = daily_df[sum_columns].apply(pd.to_numeric, errors='coerce').fillna(0)
+
+    aggregations = {column: 'last' for column in insights_name_columns if column in daily_df}
+    aggregations.update({column: 'sum' for column in sum_columns})
+    adset_df = daily_df.groupby('adset_id', sort=False).agg(aggregations).reset_index()
+    if range_reach:
+        adset_df['reach'] = pd.to_numeric(adset_df['adset_id'].map(range_reach), errors='coerce').fillna(0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        adset_df['cpc'] = (adset_df['spend'] / adset_df['clicks']).replace([np.inf, -np.inf], 0).fillna(0)
+        adset_df['ctr'] = (adset_df['clicks'] / adset_df['impressions'] * 100).replace([np.inf, -np.inf], 0).fillna(0)
+        adset_df['frequency'] = (adset_df['impressions'] / adset_df['reach']).replace([np.inf, -np.inf], 0).fillna(0)
+    adset_df['date_start'] = since.isoformat()
+    adset_df['date_stop'] = until.isoformat()
+
+    field_order = [field for field in params['fields'].split(',') if field in adset_df and field != 'actions']
+    adset_df = adset_df[field_order + [column for column in adset_df.columns if column not in field_order]]
+    return adset_df.to_dict('records')
+
+def get_targeting_data(token_value, cliente_value, adset_id):
     updated_url = url_default + adset_id
     params_targeting = {
         'access_token': token_value,
         'fields': 'name,targeting'
     }
 
-    updated_response = requests.get(updated_url, params=params_targeting)
-    updated_json_content = updated_response.json()
+    updated_json_content = cache_get(('targeting', adset_id))
+    if updated_json_content is not None and not token_has_account(token_value, cliente_value):
+        updated_json_content = None
+    if updated_json_content is None:
+        updated_response = graph_get('get_targeting_data', updated_url, params=params_targeting)
+        updated_json_content = updated_response.json()
+        if not process_error(updated_json_content):
+            cache_set(('targeting', adset_id), updated_json_content, cache_ttl_targeting)
     df_targeting = pd.json_normalize(updated_json_content)
     return df_targeting
 
+def get_targeting_chunk(token_value, adset_ids):
+    params_targeting = {
+        'access_token': token_value,
+        'ids': ','.join(adset_ids),
+        'fields': 'name,targeting'
+    }
+    updated_response = graph_get('get_targeting_chunk', url_default, params=params_targeting)
+    updated_json_content = updated_response.json()
+    if process_error(updated_json_content):
+        raise RuntimeError(updated_json_content['error'].get('message'))
+    for adset_id, row in updated_json_content.items():
+        cache_set(('targeting', adset_id), row, cache_ttl_targeting)
+    return list(updated_json_content.values())
+
+def get_targeting_data_batch(token_value, cliente_value, adset_ids):
+    targeting_rows = []
+    adset_ids_missing = []
+    adset_ids = list(dict.fromkeys(str(adset_id) for adset_id in adset_ids))
+    for adset_id in adset_ids:
+        cached_row = cache_get(('targeting', adset_id))
+        if cached_row is None:
+            adset_ids_missing.append(adset_id)
+        else:
+            targeting_rows.append(cached_row)
+    # Cached targeting is shared by every token, like the insights pages.
+    if targeting_rows and not token_has_account(token_value, cliente_value):
+        targeting_rows, adset_ids_missing = [], adset_ids
+
+    adset_ids = adset_ids_missing
+    chunks = [adset_ids[start:start + targeting_batch_size] for start in range(0, len(adset_ids), targeting_batch_size)]
+    chunk_results, chunk_errors = fetch_concurrently(token_value, get_targeting_chunk, [(token_value, chunk) for chunk in chunks])
+    targeting_rows += [row for rows in chunk_results if rows for row in rows]
+
+    # A single bad id fails its whole chunk, so retry those ids one by one.
+    failed_ids = [adset_id for index in chunk_errors for adset_id in chunks[index]]
+    single_results, single_errors = fetch_concurrently(token_value, get_targeting_chunk, [(token_value, [adset_id]) for adset_id in failed_ids])
+    targeting_rows += [row for rows in single_results if rows for row in rows]
+
+    return process_targeting_data(targeting_rows)
+
+def process_targeting_data(targeting_rows):
+    df_targeting = pd.json_normalize(targeting_rows)
+    if df_targeting.empty:
+        return pd.DataFrame(columns=['adset_id', 'age_min', 'age_max', 'gender'])
+
+    df_targeting = df_targeting.reindex(columns=['id', 'targeting.age_min', 'targeting.age_max', 'targeting.genders'])
+    df_targeting['targeting.genders'] = df_targeting['targeting.genders'].map(lambda genders: gender_labels.get(tuple(genders) if isinstance(genders, list) else (), 'Todos'))
+    df_targeting = df_targeting.rename(columns={
+        'id': 'adset_id',
+        'targeting.age_min': 'age_min',
+        'targeting.age_max': 'age_max',
+        'targeting.genders': 'gender',
+    })
+    df_targeting['adset_id'] = df_targeting['adset_id'].astype(str)
+    return df_targeting
+
+def get_http_session():
+    session = getattr(http_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=http_pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers['Accept-Encoding'] = 'gzip, deflate'
+        http_local.session = session
+        with http_sessions_lock:
+            http_sessions.add(session)
+    return session
+
+def graph_get(helper, updated_url, params):
+    return observe_graph_request(helper, 'GET', updated_url, params)
+
+def graph_post(helper, updated_url, params):
+    return observe_graph_request(helper, 'POST', updated_url, params)
+
+def observe_graph_request(helper, method, updated_url, params):
+    started_at = time.perf_counter()
+    try:
+        updated_response = get_http_session().request(method, updated_url, params=params, timeout=http_timeout)
+    except requests.RequestException as e:
+        graph_requests.labels(helper, method, type(e).__name__, '').inc()
+        raise
+    graph_request_seconds.labels(helper, method).observe(time.perf_counter() - started_at)
+    graph_response_bytes.labels(helper, method).observe(len(updated_response.content))
+    error_code = ''
+    if updated_response.status_code >= 400:
+        try:
+            error_code = str(updated_response.json().get('error', {}).get('code', ''))
+        except ValueError:
+            pass
+    graph_requests.labels(helper, method, str(updated_response.status_code), error_code).inc()
+    return updated_response
+
+def get_http_stats():
+    http_stats = {'sessions': 0, 'requests': 0, 'connections': 0}
+    with http_sessions_lock:
+        sessions = list(http_sessions)
+    for session in sessions:
+        http_stats['sessions'] += 1
+        for adapter in {id(adapter): adapter for adapter in session.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for pool_key in pools.keys():
+                pool = pools.get(pool_key)
+                if pool is not None:
+                    http_stats['requests'] += pool.num_requests
+                    http_stats['connections'] += pool.num_connections
+    http_stats['reused'] = http_stats['requests'] - http_stats['connections']
+    http_stats['reuse_ratio'] = http_stats['reused'] / http_stats['requests'] if http_stats['requests'] else 0.0
+    return http_stats
+
+def cache_get(cache_key):
+    global graph_cache_bytes
+    with graph_cache_lock:
+        entry = graph_cache.get(cache_key)
+        if entry is not None and entry['expires_at'] is not None and entry['expires_at'] <= time.time():
+            del graph_cache[cache_key]
+            graph_cache_bytes -= entry['size']
+            entry = None
+        if entry is not None:
+            graph_cache.move_to_end(cache_key)
+            cache_lookups.labels('memory_hit').inc()
+            return entry['value']
+
+    value, expires_at = shared_cache.get(cache_key, expire_time=True)
+    size = 0 if value is None else get_cache_value_size(value)
+    with graph_cache_lock:
+        if value is None:
+            cache_lookups.labels('miss').inc()
+            return None
+        store_cache_entry(cache_key, value, expires_at, size)
+    cache_lookups.labels('shared_hit').inc()
+    return value
+
+def cache_set(cache_key, value, ttl):
+    expires_at = None if ttl is None else time.time() + ttl
+    size = get_cache_value_size(value)
+    with graph_cache_lock:
+        store_cache_entry(cache_key, value, expires_at, size)
+    shared_cache.set(cache_key, value, expire=ttl)
+
+def get_cache_value_size(value):
+    return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+def store_cache_entry(cache_key, value, expires_at, size):
+    global graph_cache_bytes
+    previous_entry = graph_cache.pop(cache_key, None)
+    if previous_entry is not None:
+        graph_cache_bytes -= previous_entry['size']
+    graph_cache[cache_key] = {'value': value, 'expires_at': expires_at, 'size': size}
+    graph_cache_bytes += size
+    while graph_cache_bytes > cache_max_bytes and graph_cache:
+        evicted_entry = graph_cache.popitem(last=False)[1]
+        graph_cache_bytes -= evicted_entry['size']
+
+def clear_graph_cache():
+    global graph_cache_bytes
+    with graph_cache_lock:
+        graph_cache.clear()
+        graph_cache_bytes = 0
+
+def register_dataset(updated_df):
+    dataset_key = uuid.uuid4().hex
+    with dataset_registry_lock:
+        dataset_registry[dataset_key] = {'data': updated_df, 'last_access': time.monotonic(), 'memory_bytes': get_memory_usage(updated_df)}
+        evict_datasets()
+    if dataset_store_dir:
+        os.makedirs(dataset_store_dir, exist_ok=True)
+        updated_df.to_pickle(os.path.join(dataset_store_dir, f'{dataset_key}.pkl'))
+        evict_stored_datasets()
+    return dataset_key
+
+def get_dataset(dataset_key):
+    entry = get_dataset_entry(dataset_key)
+    return None if entry is None else entry['data']
+
+def get_dataset_entry(dataset_key):
+    if not dataset_key or not re.fullmatch('[0-9a-f]{32}', dataset_key):
+        return None
+    with dataset_registry_lock:
+        evict_datasets()
+        entry = dataset_registry.get(dataset_key)
+        if entry is not None:
+            entry['last_access'] = time.monotonic()
+            dataset_registry.move_to_end(dataset_key)
+            return entry
+
+    # Another worker may have loaded this dataset.
+    if dataset_store_dir:
+        dataset_path = os.path.join(dataset_store_dir, f'{dataset_key}.pkl')
+        if os.path.exists(dataset_path):
+            os.utime(dataset_path)
+            updated_df = pd.read_pickle(dataset_path)
+            entry = {'data': updated_df, 'last_access': time.monotonic(), 'memory_bytes': get_memory_usage(updated_df)}
+            with dataset_registry_lock:
+                dataset_registry[dataset_key] = entry
+                evict_datasets()
+            return entry
+    return None
+
+def get_entry_metrics(entry):
+    if 'metrics' not in entry:
+        entry['metrics'] = compute_metrics(entry['data'])
+    return entry['metrics']
+
+def get_view_item(entry, campaign_value, item):
+    # Items depend only on the dataset and the campaign, so each one is built once, the first time it is shown.
+    views = entry.setdefault('views', {})
+    view_key = (campaign_value, item)
+    if view_key not in views:
+        views[view_key] = view_builders[item](get_campaign_frame(entry, campaign_value), get_entry_metrics(entry)[campaign_value])
+    return views[view_key]
+
+def get_campaign_frame(entry, campaign_value):
+    views = entry.setdefault('views', {})
+    view_key = (campaign_value, 'frame')
+    if view_key not in views:
+        updated_df = entry['data']
+        if campaign_value != '':
+            updated_df = updated_df[updated_df['campaign_name'] == campaign_value]
+        views[view_key] = updated_df.sort_values(by='adset_name', ascending=False)
+    return views[view_key]
+
+def build_campaign_elements(campaign_df, metrics):
+    return generate_campaign_elements(campaign_df.iloc[::-1])
+
+def parse_filter_part(filter_part):
+    for operator_type in table_filter_operators:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+                value = value_part.strip()
+                if value and value[0] == value[-1] and value[0] in ("'", '"', '`'):
+                    value = value[1: -1].replace('\\' + value[0], value[0])
+                return name, operator_type[0].strip(), value
+    return None, None, None
+
+def filter_table_rows(campaign_df, filter_query):
+    # Filters are typed by the user; a clause that does not apply to its column is ignored instead of failing the table.
+    for filter_part in (filter_query or '').split(' && '):
+        column, operator, value = parse_filter_part(filter_part)
+        if column not in campaign_df:
+            continue
+        column_values = campaign_df[column]
+        if operator == 'contains':
+            campaign_df = campaign_df[column_values.astype(str).str.contains(value, case=False, regex=False)]
+        elif operator == 'datestartswith':
+            campaign_df = campaign_df[column_values.astype(str).str.startswith(value)]
+        elif pd.api.types.is_numeric_dtype(column_values):
+            try:
+                number = float(value)
+            except ValueError:
+                continue
+            campaign_df = campaign_df[getattr(column_values, operator)(number)]
+        elif operator in ('eq', 'ne'):
+            campaign_df = campaign_df[getattr(column_values.astype(str), operator)(value)]
+    return campaign_df
+
+def sort_table_rows(campaign_df, sort_by):
+    sort_by = [sort for sort in sort_by or [] if sort['column_id'] in campaign_df]
+    if not sort_by:
+        return campaign_df
+    return campaign_df.sort_values([sort['column_id'] for sort in sort_by], ascending=[sort['direction'] == 'asc' for sort in sort_by], kind='stable')
+
+def get_table_page(campaign_df, page_current, page_size, sort_by, filter_query):
+    campaign_df = sort_table_rows(filter_table_rows(campaign_df, filter_query), sort_by)
+    page_count = max(1, -(-len(campaign_df) // page_size))
+    page_current = min(page_current or 0, page_count - 1)
+    page_df = campaign_df.iloc[page_current * page_size:(page_current + 1) * page_size]
+    page_df = page_df.reindex(columns=[column for column, label, column_type in table_columns])
+    return page_df.to_dict('records'), page_count, page_current
+
+def build_pie_graph(campaign_df, values, labels):
+    pie_graph = px.pie(campaign_df, 
+                        values=values, 
+                        names='adset_name',
+                        labels=labels
+                        )
+    
+    pie_graph.update_traces(textinfo='percent+value')
+    pie_graph.update_layout(paper_bgcolor='#143159', 
+                            font_color='white', 
+                            height=500, 
+                            width=500, 
+                            legend=dict(orientation="h", yanchor="bottom", y=-0.5, xanchor="center", x=0.5)
+                            )
+
+    common_colors = dict(zip(campaign_df['adset_name'], px.colors.qualitative.Plotly))
+    pie_graph.update_traces(marker=dict(colors=campaign_df['adset_name'].map(common_colors)))
+    return pie_graph.to_dict()
+
+def build_spend_graph(campaign_df, metrics):
+    return build_pie_graph(campaign_df, 'spend', {'spend': 'Valor Gasto (R$)', 'adset_name': 'Conjunto de Anúncios'})
+
+def build_msg_graph(campaign_df, metrics):
+    return build_pie_graph(campaign_df, 'messaging_conversation_started_7d', {'messaging_conversation_started_7d': 'Conversas Iniciadas', 'adset_name': 'Conjunto de Anúncios'})
+
+def build_funnel_graph(campaign_df, metrics):
+    spend_funnel = metrics['spend']
+    cost_msg_funnel = round(metrics['cost_per_msg'], 2)
+
+    funnel_data = dict(
+        value = [spend_funnel, metrics['total_msg'], cost_msg_funnel],
+        labels = ['Investimento (R$)', 'Conversas Iniciadas', 'CPC (R$)']
+    )
+
+    funnel_graph = px.funnel(funnel_data,
+                                    y='labels',
+                                    x='value',
+                                    )
+    funnel_graph.update_traces(textinfo='value+label', textfont=dict(color='white'))
+    funnel_graph.update_layout(margin=dict(l=0, r=0, t=0, b=0),
+                                plot_bgcolor='#081425',
+                                font_color='white',
+                                height=300,
+                                width=400,
+                                showlegend=False,
+                                yaxis=dict(showgrid=False, visible=False),
+                                )
+    return funnel_graph.to_dict()
+
+def get_daily_chunk(token_value, cliente_value, since, until):
+    daily_frames = []
+    for updated_json_content in iter_daily_data(token_value, cliente_value, since, until, timeseries_fields):
+        if process_error(updated_json_content):
+            raise RuntimeError(updated_json_content['error'].get('message'))
+        page_df = finish_data(process_page(updated_json_content))
+        daily_frames.append(page_df.reindex(columns=timeseries_columns, fill_value=0))
+    return daily_frames
+
+def get_daily_frame(entry, token_value, dataset_key=None, on_progress=None):
+    # Daily rows are fetched the first time the time series is shown, with only the fields it plots.
+    daily_path = os.path.join(dataset_store_dir, f'{dataset_key}-daily.pkl') if dataset_store_dir and dataset_key else None
+    # The time series is drawn in a background job, so its rows are kept next to the dataset for the next job.
+    if 'daily' not in entry and daily_path and os.path.exists(daily_path):
+        os.utime(daily_path)
+        entry['daily'] = pd.read_pickle(daily_path)
+    if 'daily' not in entry:
+        daily_query = entry['data'].attrs['daily_query']
+        time_range = json.loads(daily_query['time_range'])
+        since = date.fromisoformat(time_range['since'][:10])
+        until = date.fromisoformat(time_range['until'][:10])
+        chunks = [(chunk_since, min(chunk_since + timedelta(days=timeseries_chunk_days - 1), until))
+                  for chunk_since in (since + timedelta(days=offset) for offset in range(0, (until - since).days + 1, timeseries_chunk_days))]
+        # Long ranges are read as month-long slices side by side; their pages still share the per-token limit.
+        with ThreadPoolExecutor(max_workers=max_in_flight_per_token, thread_name_prefix='timeseries') as timeseries_executor:
+            futures = [timeseries_executor.submit(get_daily_chunk, token_value, daily_query['cliente'], chunk_since, chunk_until) for chunk_since, chunk_until in chunks]
+            for chunk_number, future in enumerate(futures, start=1):
+                if future.exception() is not None:
+                    return None
+                if on_progress:
+                    on_progress(f'Períodos diários carregados: {chunk_number} de {len(futures)}', chunk_number / len(futures) * 100)
+        daily_frames = [daily_frame for future in futures for daily_frame in future.result()]
+        daily_df = pd.concat(daily_frames, ignore_index=True) if daily_frames else pd.DataFrame(columns=timeseries_columns)
+        entry['daily'] = daily_df.astype({
+            'date_start': 'datetime64[ns]',
+            'campaign_name': 'category',
+            'adset_name': 'category',
+            'spend': 'float64',
+            'messaging_conversation_started_7d': 'int64',
+        })
+        if daily_path:
+            os.makedirs(dataset_store_dir, exist_ok=True)
+            entry['daily'].to_pickle(daily_path)
+    return entry['daily']
+
+def build_daily_series(daily_df, campaign_value, series_metric, series_level, since, until):
+    if campaign_value != '':
+        daily_df = daily_df[daily_df['campaign_name'] == campaign_value]
+    series_df = daily_df.pivot_table(index='date_start', columns=timeseries_levels[series_level][0], values=timeseries_metrics[series_metric][0], aggfunc='sum', fill_value=0, observed=True)
+    # Days without delivery are zero, so every series shares the same x axis.
+    return series_df.reindex(pd.date_range(since, until), fill_value=0)
+
+def downsample_lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets over every column of y at once: the series share x, so they share the buckets.
+    point_count, series_count = y.shape
+    if threshold >= point_count or threshold < 3:
+        return np.repeat(np.arange(point_count)[:, None], series_count, axis=1)
+
+    series_index = np.arange(series_count)
+    bucket_size = (point_count - 2) / (threshold - 2)
+    selected = np.empty((threshold, series_count), dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = point_count - 1
+    previous = selected[0]
+    for bucket in range(threshold - 2):
+        range_start = int(bucket * bucket_size) + 1
+        range_end = int((bucket + 1) * bucket_size) + 1
+        next_start = range_end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, point_count)
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean(axis=0)
+        previous_x = x[previous]
+        previous_y = y[previous, series_index]
+        areas = np.abs((previous_x - next_x) * (y[range_start:range_end] - previous_y)
+                       - (previous_x - x[range_start:range_end, None]) * (next_y - previous_y))
+        previous = range_start + areas.argmax(axis=0)
+        selected[bucket + 1] = previous
+    return selected
+
+def build_timeseries_graph(series_df, series_metric, series_level):
+    days = series_df.index.to_numpy()
+    y = series_df.to_numpy(dtype='float64')
+    series_count = y.shape[1]
+    threshold = max(timeseries_min_points, timeseries_point_budget // max(series_count, 1))
+    selected = downsample_lttb((days - days[0]) / np.timedelta64(1, 'D'), y, threshold)
+
+    # Traces are plain dicts: with hundreds of series, building them through plotly express costs more than the data.
+    trace_type = 'scattergl' if selected.size > timeseries_webgl_points else 'scatter'
+    dates = np.datetime_as_string(days, unit='D')
+    hovertemplate = f'%{{x}}<br>{timeseries_metrics[series_metric][1]}: %{{y}}<extra>%{{fullData.name}}</extra>'
+    timeseries_traces = [{
+        'type': trace_type,
+        'mode': 'lines',
+        'name': str(series_name),
+        'x': dates[selected[:, column]].tolist(),
+        'y': y[selected[:, column], column].round(2).tolist(),
+        'hovertemplate': hovertemplate,
+    } for column, series_name in enumerate(series_df.columns)]
+    timeseries_layout = {
+        'paper_bgcolor': '#143159',
+        'plot_bgcolor': '#081425',
+        'font': {'color': 'white'},
+        'height': 500,
+        'showlegend': series_count <= timeseries_legend_limit,
+        'legend': {'title': {'text': timeseries_levels[series_level][1]}},
+        'xaxis': {'title': {'text': 'Data'}, 'type': 'date'},
+        'yaxis': {'title': {'text': timeseries_metrics[series_metric][1]}},
+    }
+    return {'data': timeseries_traces, 'layout': timeseries_layout}
+
+def get_timeseries_graph(entry, token_value, campaign_value, series_metric, series_level, dataset_key=None, on_progress=None):
+    views = entry.setdefault('views', {})
+    view_key = (campaign_value, ('timeseries', series_metric, series_level))
+    if view_key not in views:
+        daily_df = get_daily_frame(entry, token_value, dataset_key, on_progress)
+        if daily_df is None:
+            return None
+        time_range = json.loads(entry['data'].attrs['daily_query']['time_range'])
+        series_df = build_daily_series(daily_df, campaign_value, series_metric, series_level, time_range['since'][:10], time_range['until'][:10])
+        views[view_key] = build_timeseries_graph(series_df, series_metric, series_level) if series_df.shape[1] else {}
+    return views[view_key]
+
+view_builders = {
+    'campaign_elements': build_campaign_elements,
+    'spend_graph': build_spend_graph,
+    'msg_graph': build_msg_graph,
+    'funnel_graph': build_funnel_graph,
+}
+
+def format_currency(value):
+    return f'R$ {value:.2f}'.replace('.', ',')
+
+def format_date(date_value):
+    date_value = date_value.replace('-', '/')
+    date_value = date_value.split('/')
+    return f'{date_value[2]}/{date_value[1]}/{date_value[0]}'
+
+def get_triggered_prop_ids():
+    # Benchmarks call the callbacks as plain functions, outside of a Dash request.
+    try:
+        return ctx.triggered_prop_ids
+    except MissingCallbackContextException:
+        return {}
+
+def show_metric(metric, metrics_value, missing_metrics, value):
+    if metric not in metrics_value:
+        return no_update
+    # The dataset was loaded without the fields this metric needs.
+    if metric in missing_metrics:
+        return field_missing_message
+    return value
+
+def get_callback_entry(data_store):
+    return get_dataset_entry(data_store.get('dataset_key')) if data_store else None
+
+def evict_datasets():
+    now = time.monotonic()
+    for dataset_key in [key for key, entry in dataset_registry.items() if now - entry['last_access'] > dataset_idle_ttl]:
+        del dataset_registry[dataset_key]
+    while len(dataset_registry) > dataset_max_entries:
+        dataset_registry.popitem(last=False)
+    update_dataset_gauges()
+
+def update_dataset_gauges():
+    # A background job's copy of the registry dies with it, and its samples would be summed long after.
+    if background_job_process:
+        return
+    memory_bytes = [entry['memory_bytes'] for entry in dataset_registry.values()]
+    dataset_entries.set(len(memory_bytes))
+    dataset_memory_bytes.set(sum(memory_bytes))
+
+def evict_stored_datasets():
+    now = time.time()
+    for file_name in os.listdir(dataset_store_dir):
+        dataset_path = os.path.join(dataset_store_dir, file_name)
+        try:
+            if file_name.endswith('.pkl') and now - os.path.getmtime(dataset_path) > dataset_idle_ttl:
+                os.remove(dataset_path)
+        except FileNotFoundError:
+            pass
+
+def build_dataset(token_value, cliente_value, pages, on_progress=None, with_targeting=True):
+    page_buffers = create_page_buffers()
+    updated_json_content = {'data': []}
+    for page_number, updated_json_content in enumerate(pages, start=1):
+        if process_error(updated_json_content) or (page_buffers['rows'] == 0 and process_empty_data(updated_json_content)):
+            return updated_json_content, None
+        append_page_data(page_buffers, updated_json_content)
+        if on_progress:
+            on_progress(f'Páginas carregadas: {page_number} ({page_buffers["rows"]} linhas)')
+    if page_buffers['rows'] == 0:
+        return updated_json_content, None
+
+    updated_df = process_page_buffers(page_buffers)
+    if with_targeting:
+        if on_progress:
+            on_progress(f'Enriquecendo {updated_df["adset_id"].nunique()} conjuntos de anúncios com o público')
+        targeting_df = get_targeting_data_batch(token_value, cliente_value, updated_df['adset_id'])
+        updated_df = updated_df.merge(targeting_df, on='adset_id', how='left')
+    updated_df = apply_ingest_schema(updated_df)
+    return updated_json_content, updated_df
+
+def build_campaign_options(updated_df):
+    campaign_options = [{'label':'Todas as campanhas', 'value':''}]
+    return campaign_options + [{'label': i, 'value': i} for i in updated_df['campaign_name'].unique()]
+
+def run_report_job(token_value, cliente_value, interval_type, start_date, end_date, single_date, on_progress, fields=None, with_targeting=True):
+    report_run = start_report_run(token_value, cliente_value, interval_type, start_date, end_date, single_date, fields)
+    if process_error(report_run):
+        return report_run, None
+
+    report_run_id = str(report_run['report_run_id'])
+    deadline = time.monotonic() + report_timeout
+    while True:
+        report_status = get_report_run_status(token_value, report_run_id)
+        if process_error(report_status):
+            return report_status, None
+        async_status = report_status.get('async_status')
+        on_progress(f'Relatório assíncrono: {async_status}', report_status.get('async_percent_completion', 0))
+        if async_status == 'Job Completed':
+            break
+        if async_status not in report_running_status or time.monotonic() > deadline:
+            return {'error': {'message': async_status}}, None
+        time.sleep(report_poll_interval)
+
+    return build_dataset(token_value, cliente_value, iter_report_results(token_value, report_run_id), on_progress, with_targeting)
+
+def prefetch_account(token_value, cliente_value, single_date):
+    adset_ids = []
+    for updated_json_content in iter_updated_data(token_value, cliente_value, 'single_day', None, None, single_date):
+        if process_error(updated_json_content):
+            raise RuntimeError(updated_json_content['error'].get('message'))
+        adset_ids.extend(row['adset_id'] for row in updated_json_content['data'])
+    get_targeting_data_batch(token_value, cliente_value, adset_ids)
+
+    if insights_store_path:
+        for updated_json_content in iter_stored_data(token_value, cliente_value, 'single_day', None, None, single_date):
+            if process_error(updated_json_content):
+                raise RuntimeError(updated_json_content['error'].get('message'))
+
+def run_prefetch(token_value):
+    started_at = time.time()
+    start = time.perf_counter()
+    single_date = (date.today() - timedelta(days=1)).isoformat()
+
+    client_list = get_client_list(token_value)
+    if process_error(client_list):
+        account_ids, failures = [], 1
+    else:
+        account_ids = [client['id'] for client in client_list['data']]
+        with ThreadPoolExecutor(max_workers=prefetch_max_accounts_in_flight, thread_name_prefix='prefetch') as prefetch_executor:
+            futures = [prefetch_executor.submit(prefetch_account, token_value, account_id, single_date) for account_id in account_ids]
+            failures = sum(1 for future in futures if future.exception() is not None)
+
+    prefetch_runs.inc()
+    prefetch_failures.inc(failures)
+    prefetch_last_started.set(started_at)
+    prefetch_last_duration.set(time.perf_counter() - start)
+    prefetch_last_accounts.set(len(account_ids))
+    prefetch_last_failures.set(failures)
+
+def claim_prefetch_run():
+    # Every worker runs a scheduler, but only the first to claim the interval in the job cache warms the shared
+    # cache, so more workers, restarts and recycled workers do not repeat the run.
+    return background_callback_manager.handle.add('prefetch_claim', os.getpid(), expire=prefetch_interval)
+
+def run_prefetch_scheduler(token_value):
+    while not prefetch_stop.is_set():
+        if claim_prefetch_run():
+            try:
+                run_prefetch(token_value)
+            except Exception:
+                prefetch_runs.inc()
+                prefetch_failures.inc()
+                prefetch_last_failures.set(1)
+        prefetch_stop.wait(prefetch_claim_poll_interval)
+
+def start_prefetch_scheduler():
+    if not prefetch_token:
+        return None
+    scheduler = threading.Thread(target=run_prefetch_scheduler, args=(prefetch_token,), name='prefetch-scheduler', daemon=True)
+    scheduler.start()
+    return scheduler
+
+def reset_after_fork():
+    # Threads, held locks and pooled sockets do not survive a fork into a background job.
+    global fetch_executor, token_semaphores, token_semaphores_lock, graph_cache_lock, dataset_registry_lock, background_job_process
+    global http_local, http_sessions, http_sessions_lock
+    fetch_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='graph-fetch')
+    token_semaphores = {}
+    token_semaphores_lock = threading.Lock()
+    graph_cache_lock = threading.Lock()
+    dataset_registry_lock = threading.Lock()
+    background_job_process = True
+    http_local = threading.local()
+    http_sessions = weakref.WeakSet()
+    http_sessions_lock = threading.Lock()
+
+def is_process_alive(pid):
+    try:
+        return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+def update_background_leases(update):
+    # Cancelled jobs are killed outright, so leases of dead processes are dropped instead of released.
+    with background_callback_manager.handle.transact():
+        leases = background_callback_manager.handle.get('get_data_leases', {})
+        leases = {lease: state for lease, state in leases.items() if is_process_alive(int(lease.split(':')[0]))}
+        result = update(leases)
+        background_callback_manager.handle.set('get_data_leases', leases)
+    return result
+
+def enqueue_background_job(lease):
+    def enqueue(leases):
+        if len(leases) >= max_background_jobs + max_queued_jobs:
+            return False
+        leases[lease] = 'queued'
+        return True
+    return update_background_leases(enqueue)
+
+def start_background_job(lease):
+    def start(leases):
+        if sum(1 for state in leases.values() if state == 'running') >= max_background_jobs:
+            return False
+        leases[lease] = 'running'
+        return True
+    while not update_background_leases(start):
+        time.sleep(background_job_poll_interval)
+
+def finish_background_job(lease):
+    update_background_leases(lambda leases: leases.pop(lease, None))
+
+def hash_account(cliente_value):
+    if not cliente_value:
+        return 'sem-conta'
+    if isinstance(cliente_value, list):
+        cliente_value = ','.join(sorted(cliente_value))
+    return hashlib.sha256(str(cliente_value).encode()).hexdigest()[:16]
+
+def get_profile_phases(profiler):
+    # Time reaches a phase only through callers outside it, so helpers nested in the same phase are not counted twice;
+    # a phase called straight from another one (targeting rows normalized inside the fetch) moves out of the caller's.
+    profile_stats = pstats.Stats(profiler).stats
+    function_phases = {function: profile_phase_functions[function[2]] for function in profile_stats
+                       if function[0] == __file__ and function[2] in profile_phase_functions}
+    phases = dict.fromkeys(profile_phases, 0.0)
+    for function, phase in function_phases.items():
+        for caller, caller_stats in profile_stats[function][4].items():
+            caller_phase = function_phases.get(caller)
+            if caller_phase != phase:
+                phases[phase] += caller_stats[3]
+                if caller_phase is not None:
+                    phases[caller_phase] -= caller_stats[3]
+    return phases
+
+def write_profile(profiler, callback_name, cliente_value, wall_seconds):
+    os.makedirs(profile_dir, exist_ok=True)
+    account_hash = hash_account(cliente_value)
+    profile_name = f'{time.strftime("%Y%m%d-%H%M%S")}-{callback_name}-{account_hash}-{uuid.uuid4().hex[:6]}'
+    profiler.dump_stats(os.path.join(profile_dir, profile_name + '.prof'))
+    phases = get_profile_phases(profiler)
+    phases['other'] = max(wall_seconds - sum(phases.values()), 0.0)
+    with open(os.path.join(profile_dir, profile_name + '.json'), 'w') as profile_file:
+        json.dump({'callback': callback_name, 'account': account_hash, 'pid': os.getpid(), 'started_at': time.time() - wall_seconds,
+                   'wall_seconds': wall_seconds, 'phases': phases}, profile_file, indent=2)
+    evict_profiles()
+    return profile_name
+
+def evict_profiles():
+    # Names start with the time they were written, so sorting them puts the oldest first.
+    profile_names = sorted({os.path.splitext(file_name)[0] for file_name in os.listdir(profile_dir) if file_name.endswith(('.prof', '.json'))})
+    for profile_name in profile_names[:-profile_max_files]:
+        for extension in ('.prof', '.json'):
+            try:
+                os.remove(os.path.join(profile_dir, profile_name + extension))
+            except FileNotFoundError:
+                pass
+
+def profile_background_job(callback_name):
+    def decorate(callback_function):
+        if not (profile_all or profile_secret):
+            return callback_function
+        callback_signature = inspect.signature(callback_function)
+
+        @functools.wraps(callback_function)
+        def run_profiled(*args, **kwargs):
+            if not profile_request.get():
+                return callback_function(*args, **kwargs)
+            arguments = callback_signature.bind(*args, **kwargs).arguments
+            cliente_value = arguments.get('cliente_value') or arguments.get('portfolio_value') or get_data_store_account(arguments.get('data_store'))
+            profiler = cProfile.Profile()
+            started_at = time.perf_counter()
+            profiler.enable()
+            try:
+                return callback_function(*args, **kwargs)
+            finally:
+                profiler.disable()
+                write_profile(profiler, callback_name, cliente_value, time.perf_counter() - started_at)
+        return run_profiled
+    return decorate
+
+def render_progress(message, percent=None):
+    children = [html.H4(message, style={'color': 'white', 'margin-bottom': '5px'})]
+    if percent is not None:
+        children.append(html.Progress(value=str(int(percent)), max='100', style={'width': '330px'}))
+    return html.Div(children=children)
+
+def get_token_semaphore(token_value, max_in_flight=None):
+    max_in_flight = max_in_flight or max_in_flight_per_token
+    token_key = (hashlib.sha256(str(token_value).encode()).hexdigest(), max_in_flight)
+    with token_semaphores_lock:
+        if token_key not in token_semaphores:
+            token_semaphores[token_key] = threading.BoundedSemaphore(max_in_flight)
+        return token_semaphores[token_key]
+
+def run_with_semaphore(semaphore, fetch_function, args):
+    with semaphore:
+        return fetch_function(*args)
+
+def fetch_concurrently(token_value, fetch_function, args_list, max_in_flight=None):
+    semaphore = get_token_semaphore(token_value, max_in_flight)
+    futures = [fetch_executor.submit(run_with_semaphore, semaphore, fetch_function, args) for args in args_list]
+    results = []
+    errors = {}
+    for index, future in enumerate(futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(None)
+            errors[index] = e
+    return results, errors
+
 def get_client_list(token_value):
     updated_url = url_default + 'me/adaccounts'
     params_client = {
@@ -64,10 +1266,109 @@ def get_client_list(token_value):
         'order_by': 'name',
         'limit': 100
     }
-    updated_response = requests.get(updated_url, params=params_client)
-    updated_json_content = updated_response.json()
-
-    return updated_json_content
+    client_list = {'data': []}
+    while True:
+        updated_response = graph_get('get_client_list', updated_url, params=params_client)
+        updated_json_content = updated_response.json()
+        if process_error(updated_json_content):
+            return updated_json_content
+        client_list['data'].extend(updated_json_content.get('data', []))
+
+        paging = updated_json_content.get('paging', {})
+        after = paging.get('cursors', {}).get('after')
+        if not (paging.get('next') and after):
+            return client_list
+        params_client = dict(params_client, after=after)
+
+def get_client_options(token_value):
+    cache_key = ('client_options', hashlib.sha256(token_value.encode()).hexdigest())
+    client_list_options = cache_get(cache_key)
+    if client_list_options is not None:
+        return None, client_list_options
+
+    client_list = get_client_list(token_value)
+    if process_error(client_list):
+        return client_list, []
+
+    client_list_df = pd.json_normalize(client_list['data'])
+    if client_list_df.empty:
+        client_list_options = []
+    else:
+        client_list_df = client_list_df.rename(columns={'id': 'value', 'name': 'label'})
+        client_list_df = client_list_df.astype({'value': str, 'label': str})
+        client_list_df = client_list_df.sort_values(by='label')
+        client_list_options = client_list_df[['label', 'value']].to_dict('records')
+    cache_set(cache_key, client_list_options, client_options_ttl)
+    return None, client_list_options
+
+def token_has_account(token_value, cliente_value):
+    client_list_error, client_list_options = get_client_options(token_value)
+    return any(option['value'] == cliente_value for option in client_list_options)
+
+def filter_client_options(client_list_options, search_value, cliente_value):
+    search_value = (search_value or '').strip().lower()
+    # The portfolio dropdown selects many accounts; every selected one stays in its options.
+    selected_values = cliente_value if isinstance(cliente_value, list) else [cliente_value]
+    filtered_options = [option for option in client_list_options if option['value'] in selected_values]
+    for option in client_list_options:
+        if len(filtered_options) >= client_options_limit:
+            break
+        if option['value'] not in selected_values and (search_value in option['label'].lower() or search_value in option['value'].lower()):
+            filtered_options.append(option)
+    return filtered_options
+
+def get_portfolio_account(token_value, cliente_value, time_range):
+    updated_url = url_default + cliente_value + insights
+    page_params = build_insights_params(token_value, time_range, level='account', fields=portfolio_fields)
+    updated_json_content = get_insights_page(updated_url, page_params, cliente_value)
+    if process_error(updated_json_content):
+        raise RuntimeError(updated_json_content['error'].get('message'))
+    return [dict(row, account_id=cliente_value) for row in updated_json_content['data']]
+
+def get_portfolio_data(token_value, cliente_values, time_range):
+    # One account-level row per account, all fetched side by side, so the portfolio takes about as long as
+    # its slowest account instead of the sum of all of them.
+    account_results, account_errors = fetch_concurrently(token_value, get_portfolio_account, [(token_value, cliente_value, time_range) for cliente_value in cliente_values], max_portfolio_accounts_in_flight)
+    portfolio_rows = [row for rows in account_results if rows for row in rows]
+    return portfolio_rows, [cliente_values[index] for index in account_errors]
+
+def build_portfolio_record(account_name, metrics, total_spend):
+    record = {'account_name': account_name}
+    for column in ['total_msg', 'impressions', 'reach', 'clicks_link', 'engagement']:
+        record[column] = int(metrics[column])
+    for column in ['spend', 'cost_per_msg', 'ctr', 'cost_click', 'cost_engagement']:
+        value = float(metrics[column])
+        record[column] = round(value, 2) if np.isfinite(value) else None
+    record['spend_share'] = round(float(metrics['spend']) / total_spend * 100, 2) if total_spend else 0.0
+    return record
+
+def build_portfolio_records(portfolio_rows, cliente_values, client_labels):
+    metrics = compute_metrics(process_data({'data': portfolio_rows}), 'account_id')
+    total_spend = float(metrics['']['spend'])
+    # Accounts without delivery in the period have no insights row and rank last with zeros.
+    empty_metrics = derive_metrics(pd.Series(0, index=metric_base_columns))
+    portfolio_records = [build_portfolio_record(client_labels.get(cliente_value, cliente_value), metrics.get(cliente_value, empty_metrics), total_spend) for cliente_value in cliente_values]
+    portfolio_records.sort(key=lambda record: record['spend'], reverse=True)
+    for rank, record in enumerate(portfolio_records, start=1):
+        record['rank'] = rank
+    return portfolio_records + [build_portfolio_record('Total', metrics[''], total_spend)]
+
+def build_portfolio_graph(portfolio_records):
+    account_records = portfolio_records[:-1]
+    if not account_records:
+        return {}
+    portfolio_graph = px.bar(account_records,
+                             x='account_name',
+                             y='spend',
+                             color='cost_per_msg',
+                             labels={'account_name': 'Conta', 'spend': 'Investimento (R$)', 'cost_per_msg': 'Custo por Conversa (R$)'}
+                             )
+    portfolio_graph.update_layout(paper_bgcolor='#143159',
+                                  plot_bgcolor='#081425',
+                                  font_color='white',
+                                  height=400,
+                                  )
+    return portfolio_graph.to_dict()
 
 def process_error(updated_json_content):
     return updated_json_content.get('error')
@@ -89,10 +1390,47 @@ def extract_actions(row):
         return pd.Series()
 
 
-def process_data(updated_json_content):
+def expand_actions(actions):
+    actions_exploded = actions.explode().dropna()
+    actions_df = pd.DataFrame(actions_exploded.tolist(), index=actions_exploded.index, columns=['action_type', 'value'])
+    actions_df = actions_df.dropna()
+    actions_df['value'] = pd.to_numeric(actions_df['value'], errors='coerce')
+    action_types = pd.unique(actions_df['action_type'])
+    actions_df = actions_df.set_index('action_type', append=True)
+    actions_df = actions_df[~actions_df.index.duplicated(keep='last')]
+    actions_expanded = actions_df['value'].unstack()
+    actions_expanded = actions_expanded.reindex(index=actions.index, columns=action_types)
+    actions_expanded.columns.name = None
+    return actions_expanded
+
+def process_page(updated_json_content):
     updated_df = pd.json_normalize(updated_json_content['data'])
-    actions_expanded = updated_df['actions'].apply(extract_actions)
-    updated_df_final = pd.concat([updated_df.drop('actions', axis=1), actions_expanded], axis=1)
+    if 'actions' not in updated_df:
+        return updated_df
+    actions_expanded = expand_actions(updated_df['actions'])
+    return pd.concat([updated_df.drop('actions', axis=1), actions_expanded], axis=1)
+
+def create_page_buffers():
+    return {'rows': 0, 'columns': {}}
+
+def append_page_data(page_buffers, updated_json_content):
+    page_df = process_page(updated_json_content)
+    rows = page_buffers['rows']
+    for column in page_df.columns:
+        if column not in page_buffers['columns']:
+            page_buffers['columns'][column] = [pd.Series([None] * rows, dtype=object)] if rows else []
+    for column, chunks in page_buffers['columns'].items():
+        chunks.append(page_df[column].reset_index(drop=True) if column in page_df else pd.Series([None] * len(page_df), dtype=object))
+    page_buffers['rows'] += len(page_df)
+
+def process_page_buffers(page_buffers):
+    updated_df_final = pd.DataFrame({column: pd.concat(chunks, ignore_index=True) for column, chunks in page_buffers['columns'].items()})
+    return finish_data(updated_df_final)
+
+def process_data(updated_json_content):
+    return finish_data(process_page(updated_json_content))
+
+def finish_data(updated_df_final):
     updated_df_final = updated_df_final.fillna(0)
     updated_df_final = updated_df_final.rename(columns={
         'onsite_conversion.post_save': 'post_save',
@@ -109,37 +1447,44 @@ def update_feedback_message(updated_json_content):
     else:
         return html.H3('STATUS: Dados carregados com sucesso!', style={'text-align': 'center', 'color': 'green', 'background-color': 'white'})
 
-def get_total_investment(data):
-    data_spend = data['spend'].astype(float)
-    return data_spend.sum()
-
-def get_total_msg(data):
-    data_msg = data['messaging_conversation_started_7d'].astype(int)
-    return data_msg.sum()
-
-def get_cost_per_msg(data):
-    return get_total_investment(data) / get_total_msg(data)
-
-def get_impressions(data):
-    return data['impressions'].astype(int).sum()
-
-def get_frequency(data, reach_input):
-    return get_impressions(data) / int(reach_input)
-
-def get_ctr(data):
-    return get_clicks_link(data) / get_impressions(data) * 100
-
-def get_clicks_link(data):
-    return data['link_click'].astype(int).sum()
-
-def get_cost_click(data):
-    return get_total_investment(data) / get_clicks_link(data)
-
-def get_engagement(data):
-    return data['page_engagement'].astype(int).sum()
+def apply_ingest_schema(updated_df):
+    updated_df = updated_df.astype({column: dtype for column, dtype in ingest_schema.items() if column in updated_df})
+    for column in updated_df.columns:
+        if column not in ingest_schema and column not in ingest_text_columns:
+            # Remaining action columns: counts become the narrowest integer, values stay float.
+            updated_df[column] = pd.to_numeric(updated_df[column], errors='coerce').fillna(0)
+            if (updated_df[column] % 1 == 0).all():
+                updated_df[column] = pd.to_numeric(updated_df[column], downcast='integer')
+    return updated_df
+
+def get_memory_usage(updated_df):
+    return int(updated_df.memory_usage(deep=True).sum())
+
+def compute_metrics(updated_df, group_column='campaign_name'):
+    metric_df = updated_df.reindex(columns=[group_column, *metric_base_columns], fill_value=0)
+    metric_df = metric_df.astype({column: 'float64' if column == 'spend' else 'int64' for column in metric_base_columns})
+    campaign_sums = metric_df.groupby(group_column, observed=True, sort=False).sum()
+    metrics = {'': derive_metrics(campaign_sums.sum())}
+    for campaign_name, sums in campaign_sums.iterrows():
+        metrics[campaign_name] = derive_metrics(sums)
+    return metrics
+
+def derive_metrics(sums):
+    metrics = {
+        'spend': np.float64(sums['spend']),
+        'total_msg': np.int64(sums['messaging_conversation_started_7d']),
+        'impressions': np.int64(sums['impressions']),
+        'reach': np.int64(sums['reach']),
+        'clicks_link': np.int64(sums['link_click']),
+        'engagement': np.int64(sums['page_engagement']),
+    }
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics['cost_per_msg'] = metrics['spend'] / metrics['total_msg']
+        metrics['ctr'] = metrics['clicks_link'] / metrics['impressions'] * 100
+        metrics['cost_click'] = metrics['spend'] / metrics['clicks_link']
+        metrics['cost_engagement'] = metrics['spend'] / metrics['engagement']
+    return metrics
 
-def get_cost_engagement(data):
-    return get_total_investment(data) / get_engagement(data)
 
 app.layout = html.Div(children=[
     html.Div(children=[
@@ -233,6 +1578,24 @@ app.layout = html.Div(children=[
                             }
                         ),
                     ], style={'display': 'flex', 'justify-content': 'center', 'margin-bottom': '20px', 'padding': '0 20px'}),
+                    html.H3(children='Ou compare várias contas (portfólio)', style={'margin-bottom': '10px', 'color': 'white', 'text-font': 'bold', 'text-align': 'center'}),
+                    html.Div(children=[
+                        dcc.Dropdown(
+                            id='portfolio-dropdown',
+                            options=[],
+                            value=[],
+                            multi=True,
+                            placeholder='Selecione as contas',
+                            style={
+                                'background-color': '#f0f0f0', 
+                                'color': 'black', 
+                                'border': None,
+                                'cursor': 'pointer',
+                                'width': '330px',
+                                'margin': 'auto',
+                            }
+                        ),
+                    ], style={'display': 'flex', 'justify-content': 'center', 'margin-bottom': '20px', 'padding': '0 20px'}),
                 ], style={'display': 'none'}),
             ]),
 
@@ -317,12 +1680,49 @@ app.layout = html.Div(children=[
         'cursor': 'pointer',
         }),
 
+        html.Button('Comparar contas', id='portfolio-button', n_clicks=0, style={
+        'background-color': '#4CAF50',
+        'color': 'white',
+        'padding': '10px 20px',
+        'border': 'none',
+        'border-radius': '4px',
+        'margin': '10px auto 0px',
+        'display': 'block',
+        'cursor': 'pointer',
+        }),
+
+        dcc.Checklist(
+            id='report-mode',
+            options=[{'label': 'Relatório assíncrono (períodos longos)', 'value': 'async'}],
+            value=[],
+            style={'color': 'white', 'text-align': 'center', 'margin-top': '10px'},
+            inputStyle={'margin-right': '5px'}
+        ),
+
         html.Div(children=[
             dcc.Store(id='data-store', data={}),
+            dcc.Store(id='main-metrics-fresh', data=[]),
+            dcc.Store(id='main-metrics-enabled', data=[]),
+            dcc.Store(id='secundary-metrics-fresh', data=[]),
+            dcc.Store(id='secundary-metrics-enabled', data=[]),
+            dcc.Store(id='table-fresh', data=False),
+            dcc.Store(id='table-enabled', data=0),
         ], style={'display': 'none'}),
 
         html.Div(id='feedback-msg', style={'margin-top': 10}),
 
+        html.Div(id='portfolio-feedback-msg', style={'margin-top': 10}),
+        html.Div(id='portfolio-progress', style={'display': 'flex', 'flex-direction': 'column', 'align-items': 'center'}),
+        html.Div(id='portfolio-field', children=[
+            html.H3(children='Comparativo de contas', style={'margin-bottom': '10px', 'color': 'white', 'text-align': 'center'}),
+            dash_table.DataTable(data=[],
+                                 columns=[{'name': label, 'id': column, 'type': column_type} for column, label, column_type in portfolio_columns],
+                                 style_data_conditional=[{'if': {'filter_query': '{account_name} = "Total"'}, 'fontWeight': 'bold'}],
+                                 id='portfolio-table',
+                                 style_table={'overflowX': 'auto', 'margin': 'auto', 'width': '80%'}),
+            dcc.Graph(id='portfolio-graph', figure={}),
+        ], style={'display': 'none'}),
+
     ], style={'display': 'none', 'margin-bottom': '0px', 'margin-top': '0px', 'z-index': '50'}),
 
     html.Div(children=[
@@ -331,6 +1731,7 @@ app.layout = html.Div(children=[
             type="circle",
             children=[html.Div(id='loading-output')],
         ),
+        html.Div(id='loading-progress', style={'display': 'flex', 'flex-direction': 'column', 'align-items': 'center'}),
     ], style={'text-align': 'center', 'margin-top': '20px', 'z-index': '50'}),
 
 
@@ -368,6 +1769,7 @@ app.layout = html.Div(children=[
                     {'label': 'Funil de Conversão', 'value': 'funnel'},
                     {'label': 'Selecionar Campanhas', 'value': 'campaigns'},
                     {'label': 'Campanhas', 'value': 'campaigns_names'},
+                    {'label': 'Evolução Diária', 'value': 'timeseries'},
                 ],
                 value=['spend', 'total_msg', 'cost_per_msg', 'funnel'],
                 style={'display': 'flex', 'justify-content': 'space-evenly', 'color': 'white', 'align-items': 'center', 'margin-bottom': '20px', 'padding': '0 20px'},
@@ -616,8 +2018,43 @@ app.layout = html.Div(children=[
         ], style={'display': 'none'}),
     ], style={'display': 'flex', 'justify-content': 'space-evenly', 'margin-bottom': '20px', 'padding': '0 20px'}),
 
+    html.Div(id='timeseries-graph-field', children=[
+        html.H3(children='Evolução Diária', style={'margin-bottom': '10px', 'color': 'white', 'text-align': 'center'}),
+        html.Div(children=[
+            dcc.RadioItems(
+                id='timeseries-metric',
+                options=[{'label': label, 'value': value} for value, (column, label) in timeseries_metrics.items()],
+                value='spend',
+                style={'color': 'white'},
+                inputStyle={'margin-right': '5px', 'margin-left': '30px'}
+            ),
+            dcc.RadioItems(
+                id='timeseries-level',
+                options=[{'label': label, 'value': value} for value, (column, label) in timeseries_levels.items()],
+                value='campaign',
+                style={'color': 'white'},
+                inputStyle={'margin-right': '5px', 'margin-left': '30px'}
+            ),
+        ], style={'display': 'flex', 'justify-content': 'center', 'margin-bottom': '10px'}),
+        html.Div(id='timeseries-feedback-msg'),
+        html.Div(id='timeseries-progress', style={'display': 'flex', 'flex-direction': 'column', 'align-items': 'center'}),
+        dcc.Loading(id='loading-timeseries', type='circle', children=[dcc.Graph(id='timeseries-graph', figure={})]),
+    ], style={'display': 'none'}),
+
     html.Div(id='table-field', children=[
-        dash_table.DataTable(data=[], page_size=30, id='table', style_table={'overflowX': 'auto', 'margin': 'auto', 'width': '80%'}),
+        dash_table.DataTable(data=[], 
+                             columns=[{'name': label, 'id': column, 'type': column_type} for column, label, column_type in table_columns],
+                             page_size=30, 
+                             page_current=0,
+                             page_count=0,
+                             page_action='custom',
+                             sort_action='custom',
+                             sort_mode='multi',
+                             sort_by=[],
+                             filter_action='custom',
+                             filter_query='',
+                             id='table', 
+                             style_table={'overflowX': 'auto', 'margin': 'auto', 'width': '80%'}),
     ], style={'display': 'none'}),
 
 
@@ -625,24 +2062,42 @@ app.layout = html.Div(children=[
 
 
 
-@app.callback(
+# Pure UI toggles run in the browser, so showing or hiding a field never reaches the server.
+app.clientside_callback(
+    """
+    function(metrics_value, data_store) {
+        var show = function(value) { return metrics_value.includes(value) ? {'display': 'block'} : {'display': 'none'}; };
+        var loaded = Boolean(data_store && data_store.dataset_key);
+        var graph = function(value, style) { return loaded && metrics_value.includes(value) ? style : {'display': 'none'}; };
+        var pie_style = {'display': 'block', 'margin-bottom': '100px', 'margin-top': '100px'};
+        return [show('spend'), show('total_msg'), show('cost_per_msg'), show('funnel'), show('campaigns'), show('campaigns_names'),
+                graph('spend', pie_style), graph('total_msg', pie_style),
+                graph('funnel', {'display': 'flex', 'flex-direction': 'column', 'align-items': 'center'}),
+                graph('timeseries', {'display': 'block', 'margin-bottom': '20px', 'padding': '0 20px'})];
+    }
+    """,
     [Output('spend-show', 'style'),
      Output('msg-show', 'style'),
      Output('cost-msg-show', 'style'),
      Output('funnel-show', 'style'),
      Output('campaigns-show', 'style'),
-     Output('campaigns-names-show', 'style')],
-    [Input('main-metrics-checklist', 'value')]
+     Output('campaigns-names-show', 'style'),
+     Output('spend-graph-field', 'style'),
+     Output('msg-graph-field', 'style'),
+     Output('funnel-graph-field', 'style'),
+     Output('timeseries-graph-field', 'style')],
+    [Input('main-metrics-checklist', 'value'),
+     Input('data-store', 'data')]
 )
-def show_main_metrics(metrics_value):
-    return [{'display': 'block'} if 'spend' in metrics_value else {'display': 'none'},
-            {'display': 'block'} if 'total_msg' in metrics_value else {'display': 'none'},
-            {'display': 'block'} if 'cost_per_msg' in metrics_value else {'display': 'none'},
-            {'display': 'block'} if 'funnel' in metrics_value else {'display': 'none'},
-            {'display': 'block'} if 'campaigns' in metrics_value else {'display': 'none'},
-            {'display': 'block'} if 'campaigns_names' in metrics_value else {'display': 'none'}]
 
-@app.callback(
+app.clientside_callback(
+    """
+    function(metrics_value) {
+        var show = function(value) { return metrics_value.includes(value) ? {'display': 'block'} : {'display': 'none'}; };
+        return [show('reach'), show('impressions'), show('frequency'), show('CTR'),
+                show('clicks_link'), show('cost_click'), show('engagement'), show('cost_engagement')];
+    }
+    """,
     [Output('reach-show', 'style'),
      Output('impressions-show', 'style'),
      Output('frequency-show', 'style'),
@@ -653,54 +2108,125 @@ def show_main_metrics(metrics_value):
      Output('cost-engagement-show', 'style')],
     [Input('secundary-metrics-checklist', 'value')]
 )
-def show_secundary_metrics(metrics_value):
-    return [{'display': 'block'} if 'reach' in metrics_value else {'display': 'none'},
-            {'display': 'block'} if 'impressions' in metrics_value else {'display': 'none'},
-            {'display': 'block'} if 'frequency' in metrics_value else {'display': 'none'},
-            {'display': 'block'} if 'CTR' in metrics_value else {'display': 'none'},
-            {'display': 'block'} if 'clicks_link' in metrics_value else {'display': 'none'},
-            {'display': 'block'} if 'cost_click' in metrics_value else {'display': 'none'},
-            {'display': 'block'} if 'engagement' in metrics_value else {'display': 'none'},
-            {'display': 'block'} if 'cost_engagement' in metrics_value else {'display': 'none'}]
 
-@app.callback(
+# A checklist item is fresh while its field still shows the current campaign. Hidden fields keep their content,
+# so only turning on a stale item asks the server for data.
+track_fresh_metrics = """
+    function(metrics_value, campaign_value, fresh_value) {
+        var triggered = window.dash_clientside.callback_context.triggered.map(function(trigger) { return trigger.prop_id; });
+        if (triggered.some(function(prop_id) { return prop_id.startsWith('campaign-dropdown.'); })) {
+            return [metrics_value, window.dash_clientside.no_update];
+        }
+        var stale = metrics_value.filter(function(value) { return !(fresh_value || []).includes(value); });
+        if (stale.length === 0) {
+            return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+        }
+        return [(fresh_value || []).concat(stale), metrics_value];
+    }
+"""
+
+app.clientside_callback(
+    track_fresh_metrics,
+    [Output('main-metrics-fresh', 'data'),
+     Output('main-metrics-enabled', 'data')],
+    [Input('main-metrics-checklist', 'value'),
+     Input('campaign-dropdown', 'value')],
+    [State('main-metrics-fresh', 'data')]
+)
+
+app.clientside_callback(
+    track_fresh_metrics,
+    [Output('secundary-metrics-fresh', 'data'),
+     Output('secundary-metrics-enabled', 'data')],
+    [Input('secundary-metrics-checklist', 'value'),
+     Input('campaign-dropdown', 'value')],
+    [State('secundary-metrics-fresh', 'data')]
+)
+
+app.clientside_callback(
+    """
+    function(cliente_value, portfolio_value) {
+        if ((cliente_value !== null && cliente_value !== undefined) || (portfolio_value && portfolio_value.length)) {
+            return [{'display': 'flex', 'flex-direction': 'column', 'justify-content': 'center', 'align-items': 'top', 'margin-bottom': '20px', 'padding': '0 20px'}];
+        }
+        return [{'display': 'none'}];
+    }
+    """,
     [Output('date-field', 'style')],
-    [Input('client-dropdown', 'value')],
+    [Input('client-dropdown', 'value'),
+     Input('portfolio-dropdown', 'value')],
 )
-def show_date_field(cliente_value):
-    if cliente_value is not None:
-        return [{'display': 'flex', 'flex-direction': 'column', 'justify-content': 'center', 'align-items': 'top', 'margin-bottom': '20px', 'padding': '0 20px'}]
-    return [{'display': 'none'}]
 
 @app.callback(
     [Output('loading-token-output', 'children'),
      Output('client-field', 'style'),
      Output('token-feedback-msg', 'children'),
-     Output('client-dropdown', 'options')],
+     Output('client-dropdown', 'options'),
+     Output('portfolio-dropdown', 'options')],
     [Input('token-button', 'n_clicks')],
     [State('token-input', 'value')]
 )
 def show_client_field(n_clicks, token_value):
     if n_clicks > 0:
         if token_value is None:
-            return ['', {'display': 'none'}, html.H4('STATUS: Insira o Token de Autenticação!', style={'text-align': 'center', 'color': 'red', 'background-color': 'white'}), {}]
+            return ['', {'display': 'none'}, html.H4('STATUS: Insira o Token de Autenticação!', style={'text-align': 'center', 'color': 'red', 'background-color': 'white'}), {}, []]
         
-        client_list = get_client_list(token_value)
+        client_list_error, client_list_options = get_client_options(token_value)
         
-        if process_error(client_list):
-            return ['', {'display': 'none'},html.H4('STATUS: Token Inválido!', style={'text-align': 'center', 'color': 'red', 'background-color': 'white'}), {}] 
+        if process_error(client_list_error or {}):
+            return ['', {'display': 'none'},html.H4('STATUS: Token Inválido!', style={'text-align': 'center', 'color': 'red', 'background-color': 'white'}), {}, []] 
         
-        client_list_df = pd.json_normalize(client_list['data'])
-        client_list_df = client_list_df.rename(columns={'id': 'value', 'name': 'label'})
-        client_list_df = client_list_df.astype({'value': str, 'label': str})
-        client_list_df = client_list_df.sort_values(by='label')
-        client_list_options = client_list_df.to_dict('records')
+        # Large agencies get a trimmed list; search_client_options filters the rest on the server.
+        client_list_options = filter_client_options(client_list_options, '', None)
 
-        return ['', {'display': 'block'},html.H5('STATUS: Token Válido!', style={'text-align': 'center', 'color': 'Green', 'background-color': 'white'}), client_list_options]
-    return ['', {'display': 'none'}, html.H5('STATUS: Aguardando Envio do Token...', style={'text-align': 'center', 'color': 'white'}), {}]
+        return ['', {'display': 'block'},html.H5('STATUS: Token Válido!', style={'text-align': 'center', 'color': 'Green', 'background-color': 'white'}), client_list_options, client_list_options]
+    return ['', {'display': 'none'}, html.H5('STATUS: Aguardando Envio do Token...', style={'text-align': 'center', 'color': 'white'}), {}, []]
 
 
 @app.callback(
+    [Output('client-dropdown', 'options', allow_duplicate=True)],
+    [Input('client-dropdown', 'search_value')],
+    [State('token-input', 'value'),
+     State('client-dropdown', 'value')],
+    prevent_initial_call=True
+)
+def search_client_options(search_value, token_value, cliente_value):
+    if not token_value:
+        return [no_update]
+    # An expired or evicted list is fetched again, or the search would stop answering for large agencies.
+    client_list_error, client_list_options = get_client_options(token_value)
+    if process_error(client_list_error or {}) or len(client_list_options) <= client_options_limit:
+        return [no_update]
+    return [filter_client_options(client_list_options, search_value, cliente_value)]
+
+@app.callback(
+    [Output('portfolio-dropdown', 'options', allow_duplicate=True)],
+    [Input('portfolio-dropdown', 'search_value')],
+    [State('token-input', 'value'),
+     State('portfolio-dropdown', 'value')],
+    prevent_initial_call=True
+)
+def search_portfolio_options(search_value, token_value, portfolio_value):
+    return search_client_options(search_value, token_value, portfolio_value or [])
+
+
+app.clientside_callback(
+    """
+    function(n_clicks) {
+        if (n_clicks % 2 === 0) {
+            return [{'display': 'block'}, 
+                    {'display': 'block'},
+                    {'margin-bottom': '20px', 'padding': '0 20px', 'border': '2px solid #ddd', 'border-radius': '5px', 'background-color': '#040911'},
+                    {'margin-top': '20px','margin-bottom': '20px', 'padding': '0 20px', 'border': '2px solid #ddd', 'border-radius': '5px', 'background-color': '#040911'},
+                    {'background-color': '#4CAF50', 'color': 'white', 'padding': '10px 20px', 'border': 'none', 'border-radius': '4px', 'margin': 'auto', 'display': 'block', 'cursor': 'pointer'}];
+        }
+        return [{'display': 'none'},
+                {'display': 'none'}, 
+                {'display': 'none'},
+                {'display': 'none'},
+                {'background-color': '#081425', 'color': 'white', 'padding': '10px 20px', 'border': '2px solid #000000', 'border-radius': '4px', 'margin': 'auto', 'display': 'block', 'cursor': 'pointer'}];
+    }
+    """,
     [Output('Autentication-fields', 'style'),
      Output('table-field', 'style'),
      Output('metrics-fields-setup', 'style'),
@@ -708,32 +2234,44 @@ def show_client_field(n_clicks, token_value):
      Output('presentation-button', 'style')],
     [Input('presentation-button', 'n_clicks')]
 )
-def show_auth_fields(n_clicks):
-    if n_clicks%2 == 0:
-        return [{'display': 'block'}, 
-                {'display': 'block'},
-                {'margin-bottom': '20px', 'padding': '0 20px', 'border': '2px solid #ddd', 'border-radius': '5px', 'background-color': '#040911'},
-                {'margin-top': '20px','margin-bottom': '20px', 'padding': '0 20px', 'border': '2px solid #ddd', 'border-radius': '5px', 'background-color': '#040911'},
-                {'background-color': '#4CAF50', 'color': 'white', 'padding': '10px 20px', 'border': 'none', 'border-radius': '4px', 'margin': 'auto', 'display': 'block', 'cursor': 'pointer'}]
-    
-    return [{'display': 'none'},
-            {'display': 'none'}, 
-            {'display': 'none'},
-            {'display': 'none'},
-            {'background-color': '#081425', 'color': 'white', 'padding': '10px 20px', 'border': '2px solid #000000', 'border-radius': '4px', 'margin': 'auto', 'display': 'block', 'cursor': 'pointer'}]
 
-@app.callback(
+# The table is only filled while visible; leaving presentation mode refills it only if the campaign changed meanwhile.
+app.clientside_callback(
+    """
+    function(n_clicks, campaign_value, table_fresh) {
+        var visible = n_clicks % 2 === 0;
+        var triggered = window.dash_clientside.callback_context.triggered.map(function(trigger) { return trigger.prop_id; });
+        if (triggered.some(function(prop_id) { return prop_id.startsWith('campaign-dropdown.'); })) {
+            return [visible, window.dash_clientside.no_update];
+        }
+        if (!visible || table_fresh) {
+            return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+        }
+        return [true, n_clicks];
+    }
+    """,
+    [Output('table-fresh', 'data'),
+     Output('table-enabled', 'data')],
+    [Input('presentation-button', 'n_clicks'),
+     Input('campaign-dropdown', 'value')],
+    [State('table-fresh', 'data')]
+)
+
+app.clientside_callback(
+    """
+    function(interval_type) {
+        if (interval_type === 'range') {
+            return [{'display': 'block'}, {'display': 'none'}];
+        } else if (interval_type === 'single_day') {
+            return [{'display': 'none'}, {'display': 'block'}];
+        }
+        return [{'display': 'none'}, {'display': 'none'}];
+    }
+    """,
     [Output('date-range', 'style'),
      Output('date-picker', 'style')],
     [Input('interval-type', 'value')]
 )
-def update_date_picker_style(interval_type):
-    if interval_type == 'range':
-        return {'display': 'block'}, {'display': 'none'}
-    elif interval_type == 'single_day':
-        return {'display': 'none'}, {'display': 'block'}
-    else:
-        return {'display': 'none'}, {'display': 'none'}
     
 @app.callback(
     [Output('feedback-msg', 'children'),
@@ -748,9 +2286,18 @@ def update_date_picker_style(interval_type):
      State('interval-type', 'value'),
      State('date-range', 'start_date'),
      State('date-range', 'end_date'),
-     State('date-picker', 'date',)]
+     State('date-picker', 'date',),
+     State('report-mode', 'value'),
+     State('main-metrics-checklist', 'value'),
+     State('secundary-metrics-checklist', 'value'),
+     State('presentation-button', 'n_clicks')],
+    background=True,
+    progress=[Output('loading-progress', 'children')],
+    progress_default=[''],
+    interval=500
 )
-def get_data(n_clicks, token_value, cliente_value, reach_input, interval_type, start_date, end_date, single_date):
+@profile_background_job('get_data')
+def get_data(set_progress, n_clicks, token_value, cliente_value, reach_input, interval_type, start_date, end_date, single_date, report_mode, main_metrics_value=None, secundary_metrics_value=None, presentation_clicks=0):
     if n_clicks > 0:
         
         if token_value is None:
@@ -798,214 +2345,387 @@ def get_data(n_clicks, token_value, cliente_value, reach_input, interval_type, s
                 {}
                 ]
 
-        updated_json_content = get_updated_data(token_value, cliente_value, interval_type, start_date, end_date, single_date)
-
-        if process_error(updated_json_content) or process_empty_data(updated_json_content):
+        # Only the fields behind the enabled metrics are requested; the table, shown outside presentation mode, needs all of them.
+        if main_metrics_value is None or secundary_metrics_value is None or presentation_clicks%2 == 0:
+            fields = build_insights_fields(['table'])
+        else:
+            fields = build_insights_fields(main_metrics_value + secundary_metrics_value)
+        with_targeting = fields == build_insights_fields(['table'])
+
+        # Bounded queue: a burst of submissions waits for a free slot instead of loading the box.
+        lease = f'{os.getpid()}:{threading.get_ident()}'
+        if not enqueue_background_job(lease):
+            return [html.Div('STATUS: Servidor ocupado, tente novamente em instantes.', style={'text-align': 'center', 'color': 'red', 'background-color': 'white'}), '', [], '', {}]
+        job_started_at = time.perf_counter()
+        try:
+            set_progress([render_progress('Na fila de processamento...')])
+            start_background_job(lease)
+            on_progress = lambda message, percent=None: set_progress([render_progress(message, percent)])
+            if 'async' in (report_mode or []):
+                updated_json_content, updated_df = run_report_job(token_value, cliente_value, interval_type, start_date, end_date, single_date, on_progress, fields, with_targeting)
+            else:
+                if insights_store_path:
+                    # The daily store keeps every field, so narrower views are served from it as is.
+                    fields, with_targeting = params['fields'], True
+                    pages = iter_stored_data(token_value, cliente_value, interval_type, start_date, end_date, single_date)
+                else:
+                    pages = iter_updated_data(token_value, cliente_value, interval_type, start_date, end_date, single_date, fields)
+                updated_json_content, updated_df = build_dataset(token_value, cliente_value, pages, on_progress, with_targeting)
+        finally:
+            finish_background_job(lease)
+            background_job_seconds.labels('get_data').observe(time.perf_counter() - job_started_at)
+
+        if updated_df is None:
             return [update_feedback_message(updated_json_content), '', [], '', {}]
+
+        updated_df.attrs['fields'] = fields + (',targeting' if with_targeting else '')
+        updated_df.attrs['daily_query'] = {'cliente': cliente_value, 'time_range': build_time_range(interval_type, start_date, end_date, single_date)}
+        all_campaign_options = build_campaign_options(updated_df)
         
-        updated_df = process_data(updated_json_content)
-        updated_df['age_min'] = None
-        updated_df['age_max'] = None
-        updated_df['gender'] = None
-        
-        for index, row in updated_df.iterrows():
-            adset_id = row['adset_id']
-            ad_set_targeting = get_targeting_data(token_value, adset_id)
-            if not ad_set_targeting.empty:
-                updated_df.at[index, 'age_min'] = ad_set_targeting['targeting.age_min'].values[0]
-                updated_df.at[index, 'age_max'] = ad_set_targeting['targeting.age_max'].values[0]
-            
-        campaign_options = [{'label':'Todas as campanhas', 'value':''}]
-        all_campaign_options = campaign_options + [{'label': i, 'value': i} for i in updated_df['campaign_name'].unique()]
-        
-        return [update_feedback_message(updated_json_content), '', all_campaign_options, campaign_options[0]['value'], updated_df.to_dict('records')]
+        return [update_feedback_message(updated_json_content), '', all_campaign_options, '', {'dataset_key': register_dataset(updated_df)}]
     
     return [html.Div('STATUS: Aguardando Envio...', style={'text-align': 'center', 'color': 'white'}), '', [], '', {}]
 
 @app.callback(
-    [Output('campaigns-names', 'children'),
-     Output('table', 'data'),
-     Output('spend-field', 'children'),
-     Output('date-begin-field', 'children'),
-     Output('date-end-field', 'children'),
-     Output('total-msg-field', 'children'),
-     Output('cost-per-msg-field', 'children'),
-     Output('reach-field', 'children'),
-     Output('impressions-field', 'children'),
-     Output('frequency-field', 'children'),
-     Output('CTR-field', 'children'),
-     Output('clicks-link-field', 'children'),
-     Output('cost-click-field', 'children'),
-     Output('engagement-field', 'children'),
-     Output('cost-engagement-field', 'children'),
-     Output('spend-graph-field', 'style'),
-     Output('spend-graph', 'figure'),
-     Output('msg-graph-field', 'style'),
-     Output('msg-graph', 'figure'),
-     Output('funnel-graph-field', 'style'),
-     Output('funnel-graph', 'figure')],
-    [Input('campaign-dropdown', 'value')],
-    [State('reach-input', 'value'),
+    [Output('portfolio-feedback-msg', 'children'),
+     Output('portfolio-table', 'data'),
+     Output('portfolio-graph', 'figure'),
+     Output('portfolio-field', 'style')],
+    [Input('portfolio-button', 'n_clicks')],
+    [State('token-input', 'value'),
+     State('portfolio-dropdown', 'value'),
      State('interval-type', 'value'),
      State('date-range', 'start_date'),
      State('date-range', 'end_date'),
-     State('date-picker', 'date'),
-     State('data-store', 'data')]
+     State('date-picker', 'date')],
+    background=True,
+    progress=[Output('portfolio-progress', 'children')],
+    progress_default=[''],
+    interval=500,
+    prevent_initial_call=True
 )
-def update_graph(campaign_value, reach_input, interval_type, start_date, end_date, single_date, df):
-    if df != {}:
-        updated_df = pd.DataFrame(df)
-        if campaign_value != '':
-            updated_df = updated_df[updated_df['campaign_name'] == campaign_value]
-
-        updated_df = updated_df.sort_values(by='adset_name', ascending=True)
-
-        campaign_elements = generate_campaign_elements(updated_df)
-
-        spend = get_total_investment(updated_df)
-        spend = f'R$ {spend:.2f}'.replace('.', ',')
+@profile_background_job('update_portfolio')
+def update_portfolio(set_progress, n_clicks, token_value, portfolio_value, interval_type, start_date, end_date, single_date):
+    if token_value is None:
+        return [html.Div('Insira o Token!', style={'text-align': 'center', 'color': 'red', 'background-color': 'white'}), [], {}, {'display': 'none'}]
 
-        date_begin = start_date if interval_type == 'range' else single_date
-        date_begin = date_begin.replace('-', '/')
-        date_begin = date_begin.split('/')
-        date_begin = f'{date_begin[2]}/{date_begin[1]}/{date_begin[0]}'
+    if not portfolio_value:
+        return [html.Div('Selecione as contas do portfólio!', style={'text-align': 'center', 'color': 'red', 'background-color': 'white'}), [], {}, {'display': 'none'}]
 
-        date_end = end_date if interval_type == 'range' else single_date
-        date_end = date_end.replace('-', '/')
-        date_end = date_end.split('/')
-        date_end = f'{date_end[2]}/{date_end[1]}/{date_end[0]}'
+    if (interval_type == 'range' and (start_date is None or end_date is None)) or (interval_type == 'single_day' and single_date is None):
+        return [html.Div('Selecione as datas!', style={'text-align': 'center', 'color': 'red', 'background-color': 'white'}), [], {}, {'display': 'none'}]
 
-        total_msg = get_total_msg(updated_df)
+    lease = f'{os.getpid()}:{threading.get_ident()}'
+    if not enqueue_background_job(lease):
+        return [html.Div('STATUS: Servidor ocupado, tente novamente em instantes.', style={'text-align': 'center', 'color': 'red', 'background-color': 'white'}), [], {}, {'display': 'none'}]
+    job_started_at = time.perf_counter()
+    try:
+        set_progress([render_progress('Na fila de processamento...')])
+        start_background_job(lease)
+        set_progress([render_progress(f'Carregando {len(portfolio_value)} contas...')])
+        time_range = build_time_range(interval_type, start_date, end_date, single_date)
+        portfolio_rows, failed_values = get_portfolio_data(token_value, portfolio_value, time_range)
+    finally:
+        finish_background_job(lease)
+        background_job_seconds.labels('update_portfolio').observe(time.perf_counter() - job_started_at)
+
+    client_list_error, client_list_options = get_client_options(token_value)
+    client_labels = {option['value']: option['label'] for option in client_list_options}
+    portfolio_records = build_portfolio_records(portfolio_rows, [value for value in portfolio_value if value not in failed_values], client_labels)
+
+    if failed_values:
+        failed_labels = ', '.join(client_labels.get(value, value) for value in failed_values)
+        feedback_msg = html.H3(f'STATUS: Erro ao carregar {len(failed_values)} conta(s): {failed_labels}', style={'text-align': 'center', 'color': 'red', 'background-color': 'white'})
+    else:
+        feedback_msg = html.H3('STATUS: Portfólio carregado com sucesso!', style={'text-align': 'center', 'color': 'green', 'background-color': 'white'})
+    # With every account failed there is nothing to rank, only the error.
+    if len(failed_values) == len(portfolio_value):
+        return [feedback_msg, [], {}, {'display': 'none'}]
+    return [feedback_msg, portfolio_records, build_portfolio_graph(portfolio_records), {'display': 'block'}]
 
-        cost_per_msg = get_cost_per_msg(updated_df)
-        cost_per_msg = f'R$ {cost_per_msg:.2f}'.replace('.', ',')
+@app.callback(
+    [Output('date-begin-field', 'children'),
+     Output('date-end-field', 'children')],
+    [Input('campaign-dropdown', 'value')],
+    [State('interval-type', 'value'),
+     State('date-range', 'start_date'),
+     State('date-range', 'end_date'),
+     State('date-picker', 'date'),
+     State('data-store', 'data')]
+)
+def update_period(campaign_value, interval_type, start_date, end_date, single_date, data_store):
+    if get_callback_entry(data_store) is None:
+        return ['', '']
+    date_begin = format_date(start_date if interval_type == 'range' else single_date)
+    date_end = format_date(end_date if interval_type == 'range' else single_date)
+    return [date_begin, date_end]
 
-        if campaign_value == '':
-            reach = reach_input
-        else:
-            reach = updated_df['reach'].astype(int).sum()
+@app.callback(
+    [Output('spend-field', 'children'),
+     Output('total-msg-field', 'children'),
+     Output('cost-per-msg-field', 'children')],
+    [Input('campaign-dropdown', 'value'),
+     Input('main-metrics-enabled', 'data')],
+    [State('main-metrics-checklist', 'value'),
+     State('data-store', 'data')]
+)
+def update_main_metrics(campaign_value, enabled_value, metrics_value, data_store):
+    entry = get_callback_entry(data_store)
+    if entry is None:
+        return ['', '', '']
+    metrics = get_entry_metrics(entry)[campaign_value or '']
+    missing_metrics = get_missing_metrics(entry, metrics_value)
+    return [show_metric('spend', metrics_value, missing_metrics, format_currency(metrics['spend'])),
+            show_metric('total_msg', metrics_value, missing_metrics, metrics['total_msg']),
+            show_metric('cost_per_msg', metrics_value, missing_metrics, format_currency(metrics['cost_per_msg']))]
 
-        impressions = get_impressions(updated_df)
+@app.callback(
+    [Output('reach-field', 'children'),
+     Output('impressions-field', 'children'),
+     Output('frequency-field', 'children'),
+     Output('CTR-field', 'children'),
+     Output('clicks-link-field', 'children'),
+     Output('cost-click-field', 'children'),
+     Output('engagement-field', 'children'),
+     Output('cost-engagement-field', 'children')],
+    [Input('campaign-dropdown', 'value'),
+     Input('secundary-metrics-enabled', 'data')],
+    [State('secundary-metrics-checklist', 'value'),
+     State('reach-input', 'value'),
+     State('data-store', 'data')]
+)
+def update_secundary_metrics(campaign_value, enabled_value, metrics_value, reach_input, data_store):
+    entry = get_callback_entry(data_store)
+    if entry is None:
+        return ['', '', '', '', '', '', '', '']
+    campaign_value = campaign_value or ''
+    metrics = get_entry_metrics(entry)[campaign_value]
+
+    if campaign_value == '':
+        reach = reach_input
+    else:
+        reach = metrics['reach']
 
-        frequency = get_frequency(updated_df, reach)
+    missing_metrics = get_missing_metrics(entry, metrics_value)
+    frequency = None
+    if 'frequency' in metrics_value and 'frequency' not in missing_metrics:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            frequency = metrics['impressions'] / int(reach)
         frequency = f'{frequency:.2f}'.replace('.', ',')
 
-        ctr = get_ctr(updated_df)
-        ctr = f'{ctr:.2f}%'.replace('.', ',')
-
-        clicks_link = get_clicks_link(updated_df)
+    return [show_metric('reach', metrics_value, missing_metrics, reach),
+            show_metric('impressions', metrics_value, missing_metrics, metrics['impressions']),
+            show_metric('frequency', metrics_value, missing_metrics, frequency),
+            show_metric('CTR', metrics_value, missing_metrics, f'{metrics["ctr"]:.2f}%'.replace('.', ',')),
+            show_metric('clicks_link', metrics_value, missing_metrics, metrics['clicks_link']),
+            show_metric('cost_click', metrics_value, missing_metrics, format_currency(metrics['cost_click'])),
+            show_metric('engagement', metrics_value, missing_metrics, metrics['engagement']),
+            show_metric('cost_engagement', metrics_value, missing_metrics, format_currency(metrics['cost_engagement']))]
 
-        cost_click = get_cost_click(updated_df)
-        cost_click = f'R$ {cost_click:.2f}'.replace('.', ',')
+@app.callback(
+    [Output('campaigns-names', 'children')],
+    [Input('campaign-dropdown', 'value'),
+     Input('main-metrics-enabled', 'data')],
+    [State('main-metrics-checklist', 'value'),
+     State('data-store', 'data')]
+)
+def update_campaigns_names(campaign_value, enabled_value, metrics_value, data_store):
+    entry = get_callback_entry(data_store)
+    if entry is None:
+        return ['']
+    if 'campaigns_names' not in metrics_value:
+        return [no_update]
+    return [get_view_item(entry, campaign_value or '', 'campaign_elements')]
 
-        engagement = get_engagement(updated_df)
+@app.callback(
+    [Output('table', 'data'),
+     Output('table', 'page_count'),
+     Output('table', 'page_current')],
+    [Input('campaign-dropdown', 'value'),
+     Input('table-enabled', 'data'),
+     Input('table', 'page_current'),
+     Input('table', 'page_size'),
+     Input('table', 'sort_by'),
+     Input('table', 'filter_query')],
+    [State('presentation-button', 'n_clicks'),
+     State('data-store', 'data')]
+)
+def update_table(campaign_value, enabled_value, page_current, page_size, sort_by, filter_query, n_clicks, data_store):
+    entry = get_callback_entry(data_store)
+    if entry is None:
+        return [[], 0, 0]
+    # The table is hidden in presentation mode.
+    if n_clicks%2 != 0:
+        return [no_update, no_update, no_update]
+    # A new campaign or filter starts again from the first page.
+    triggered_prop_ids = get_triggered_prop_ids()
+    if 'campaign-dropdown.value' in triggered_prop_ids or 'table.filter_query' in triggered_prop_ids:
+        page_current = 0
+    page_rows, page_count, page_current = get_table_page(get_campaign_frame(entry, campaign_value or ''), page_current, page_size, sort_by, filter_query)
+    # The dataset was loaded in presentation mode without the fields behind these columns.
+    missing_columns = get_missing_table_columns(entry)
+    for row in page_rows:
+        row.update(dict.fromkeys(missing_columns, field_missing_message))
+    return [page_rows, page_count, page_current]
 
-        cost_engagement = get_cost_engagement(updated_df)
-        cost_engagement = f'R$ {cost_engagement:.2f}'.replace('.', ',')
+@app.callback(
+    [Output('spend-graph', 'figure')],
+    [Input('campaign-dropdown', 'value'),
+     Input('main-metrics-enabled', 'data')],
+    [State('main-metrics-checklist', 'value'),
+     State('data-store', 'data')]
+)
+def update_spend_graph(campaign_value, enabled_value, metrics_value, data_store):
+    entry = get_callback_entry(data_store)
+    if entry is None:
+        return [{}]
+    if 'spend' not in metrics_value:
+        return [no_update]
+    if get_missing_metrics(entry, ['spend']):
+        return [{}]
+    return [get_view_item(entry, campaign_value or '', 'spend_graph')]
 
-        updated_df = updated_df.astype({'spend': float, 'messaging_conversation_started_7d': int})
-        updated_df = updated_df.sort_values(by='adset_name', ascending=False)
+@app.callback(
+    [Output('msg-graph', 'figure')],
+    [Input('campaign-dropdown', 'value'),
+     Input('main-metrics-enabled', 'data')],
+    [State('main-metrics-checklist', 'value'),
+     State('data-store', 'data')]
+)
+def update_msg_graph(campaign_value, enabled_value, metrics_value, data_store):
+    entry = get_callback_entry(data_store)
+    if entry is None:
+        return [{}]
+    if 'total_msg' not in metrics_value:
+        return [no_update]
+    if get_missing_metrics(entry, ['total_msg']):
+        return [{}]
+    return [get_view_item(entry, campaign_value or '', 'msg_graph')]
 
-        spend_graph = px.pie(updated_df, 
-                                values='spend', 
-                                names='adset_name',
-                                labels={'spend': 'Valor Gasto (R$)', 'adset_name': 'Conjunto de Anúncios'}
-                                )
-        
-        spend_graph.update_traces(textinfo='percent+value')
-        spend_graph.update_layout(paper_bgcolor='#143159', 
-                                    font_color='white', 
-                                    height=500, 
-                                    width=500, 
-                                    legend=dict(orientation="h", yanchor="bottom", y=-0.5, xanchor="center", x=0.5)
-                                    )
+@app.callback(
+    [Output('funnel-graph', 'figure')],
+    [Input('campaign-dropdown', 'value'),
+     Input('main-metrics-enabled', 'data')],
+    [State('main-metrics-checklist', 'value'),
+     State('data-store', 'data')]
+)
+def update_funnel_graph(campaign_value, enabled_value, metrics_value, data_store):
+    entry = get_callback_entry(data_store)
+    if entry is None:
+        return [{}]
+    if 'funnel' not in metrics_value:
+        return [no_update]
+    if get_missing_metrics(entry, ['funnel']):
+        return [{}]
+    return [get_view_item(entry, campaign_value or '', 'funnel_graph')]
 
-        msg_graph = px.pie(updated_df, 
-                            values='messaging_conversation_started_7d', 
-                            names='adset_name', 
-                            labels={'messaging_conversation_started_7d': 'Conversas Iniciadas', 'adset_name': 'Conjunto de Anúncios'}
-                            )
-        
-        msg_graph.update_traces(textinfo='percent+value')
-        msg_graph.update_layout(paper_bgcolor='#143159', 
-                                font_color='white', 
-                                height=500, 
-                                width=500, 
-                                legend=dict(orientation="h", yanchor="bottom", y=-0.5, xanchor="center", x=0.5)
-                                )
-        
-        common_colors = dict(zip(updated_df['adset_name'], px.colors.qualitative.Plotly))
-
-        spend_graph.update_traces(marker=dict(colors=updated_df['adset_name'].map(common_colors)))
-        msg_graph.update_traces(marker=dict(colors=updated_df['adset_name'].map(common_colors)))
-
-
-        spend_funnel = get_total_investment(updated_df)
-        cost_msg_funnel = round(spend_funnel/total_msg, 2)
-
-        funnel_data = dict(
-            value = [spend_funnel, total_msg, cost_msg_funnel],
-            labels = ['Investimento (R$)', 'Conversas Iniciadas', 'CPC (R$)']
-        )
-
-        funnel_graph = px.funnel(funnel_data,
-                                        y='labels',
-                                        x='value',
-                                        )
-        funnel_graph.update_traces(textinfo='value+label', textfont=dict(color='white'))
-        funnel_graph.update_layout(margin=dict(l=0, r=0, t=0, b=0),
-                                    plot_bgcolor='#081425',
-                                    font_color='white',
-                                    height=300,
-                                    width=400,
-                                    showlegend=False,
-                                    yaxis=dict(showgrid=False, visible=False),
-                                    )
-        
+@app.callback(
+    [Output('timeseries-graph', 'figure'),
+     Output('timeseries-feedback-msg', 'children')],
+    [Input('campaign-dropdown', 'value'),
+     Input('main-metrics-enabled', 'data'),
+     Input('timeseries-metric', 'value'),
+     Input('timeseries-level', 'value')],
+    [State('main-metrics-checklist', 'value'),
+     State('token-input', 'value'),
+     State('data-store', 'data')],
+    background=True,
+    progress=[Output('timeseries-progress', 'children')],
+    progress_default=[''],
+    interval=500
+)
+@profile_background_job('update_timeseries_graph')
+def update_timeseries_graph(set_progress, campaign_value, enabled_value, series_metric, series_level, metrics_value, token_value, data_store):
+    entry = get_callback_entry(data_store)
+    if entry is None:
+        return [{}, '']
+    if 'timeseries' not in metrics_value:
+        return [no_update, no_update]
+
+    # The first view of a long period downloads its whole daily history, so it waits in the same queue as get_data.
+    lease = f'{os.getpid()}:{threading.get_ident()}'
+    if not enqueue_background_job(lease):
+        return [{}, html.H4('STATUS: Servidor ocupado, tente novamente em instantes.', style={'text-align': 'center', 'color': 'red', 'background-color': 'white'})]
+    job_started_at = time.perf_counter()
+    try:
+        set_progress([render_progress('Na fila de processamento...')])
+        start_background_job(lease)
+        on_progress = lambda message, percent=None: set_progress([render_progress(message, percent)])
+        timeseries_graph = get_timeseries_graph(entry, token_value, campaign_value or '', series_metric, series_level, data_store['dataset_key'], on_progress)
+    finally:
+        finish_background_job(lease)
+        background_job_seconds.labels('update_timeseries_graph').observe(time.perf_counter() - job_started_at)
+
+    if timeseries_graph is None:
+        return [{}, html.H4('STATUS: Erro ao carregar a evolução diária. Verifique o token e tente novamente.', style={'text-align': 'center', 'color': 'red', 'background-color': 'white'})]
+    return [timeseries_graph, '']
+
+def get_callback_name(request_json):
+    callback = app.callback_map.get((request_json or {}).get('output'), {}).get('callback')
+    return callback.__name__ if callback else 'desconhecido'
+
+def get_request_account(request_json):
+    values = {f'{item["id"]}.{item["property"]}': item.get('value') for item in (request_json or {}).get('inputs', []) + (request_json or {}).get('state', [])
+              if isinstance(item, dict) and 'id' in item}
+    if values.get('client-dropdown.value') or values.get('portfolio-dropdown.value'):
+        return values.get('client-dropdown.value') or values.get('portfolio-dropdown.value')
+    return get_data_store_account(values.get('data-store.data'))
+
+def get_data_store_account(data_store):
+    # View callbacks only carry the dataset key; the dataset remembers its account.
+    entry = get_callback_entry(data_store)
+    return entry['data'].attrs.get('daily_query', {}).get('cliente') if entry is not None else None
+
+def should_profile_request():
+    if profile_all:
+        return True
+    # Bytes, because compare_digest rejects str with non-ASCII characters and any client sets this header.
+    return hmac.compare_digest(request.headers.get(profile_header, '').encode(), profile_secret.encode())
+
+@server.before_request
+def start_callback_timer():
+    g.request_started_at = time.perf_counter()
+    if (profile_all or profile_secret) and request.path.endswith('/_dash-update-component'):
+        g.profile_request_token = profile_request.set(should_profile_request())
+        if profile_request.get():
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+@server.after_request
+def observe_callback_request(response):
+    if request.path.endswith('/_dash-update-component') and 'request_started_at' in g:
+        wall_seconds = time.perf_counter() - g.request_started_at
+        # Background callbacks answer with a job key first and are then polled until the result is ready.
+        request_kind = 'poll' if 'cacheKey' in request.args else 'call'
+        callback = get_callback_name(request.get_json(silent=True))
+        callback_seconds.labels(callback, request_kind).observe(wall_seconds)
+        callback_response_bytes.labels(callback, request_kind).observe(response.calculate_content_length() or 0)
+        if 'profiler' in g:
+            g.profiler.disable()
+            profile_name = write_profile(g.profiler, callback, get_request_account(request.get_json(silent=True)), wall_seconds)
+            response.headers[profile_header] = profile_name
+    return response
+
+@server.teardown_request
+def stop_callback_profiler(error=None):
+    # A callback that raised never reaches after_request; its profiler must not keep running on this thread.
+    if 'profiler' in g:
+        g.profiler.disable()
+    if 'profile_request_token' in g:
+        profile_request.reset(g.profile_request_token)
+
+@server.route('/metrics')
+def metrics():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
 
-        return [campaign_elements,
-                updated_df.to_dict('records'),
-                spend,
-                date_begin, 
-                date_end, 
-                total_msg, 
-                cost_per_msg, 
-                reach, 
-                impressions, 
-                frequency, 
-                ctr, 
-                clicks_link, 
-                cost_click, 
-                engagement, 
-                cost_engagement, 
-                {'display': 'block', 'margin-bottom': '100px', 'margin-top': '100px'}, 
-                spend_graph, 
-                {'display': 'block', 'margin-bottom': '100px', 'margin-top': '100px'}, 
-                msg_graph, 
-                {'display': 'flex', 'flex-direction': 'column', 'align-items': 'center'}, 
-                funnel_graph]
-    return ['',
-            [],
-            '',
-            '',
-            '',
-            '',
-            '',
-            '',
-            '',
-            '',
-            '',
-            '',
-            '',
-            '',
-            '',
-            {'display': 'none'},
-            {},
-            {'display': 'none'},
-            {},
-            {'display': 'none'},
-            {}]
 
+os.register_at_fork(after_in_child=reset_after_fork)
+start_prefetch_scheduler()
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,37 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import Dashboard
+from mock_graph import make_adset
+
+row_counts = [1000, 10000, 100000]
+
+
+def expand_with_apply(actions):
+    return actions.apply(Dashboard.extract_actions)
+
+
+def timed(expand_function, actions):
+    start = time.perf_counter()
+    actions_expanded = expand_function(actions)
+    return actions_expanded, time.perf_counter() - start
+
+
+def main():
+    print(f'{"linhas":>8} {"apply (s)":>10} {"vetorizado (s)":>15} {"ganho":>7}')
+    for row_count in row_counts:
+        actions = pd.Series([make_adset(index)['actions'] for index in range(row_count)])
+        expected, apply_elapsed = timed(expand_with_apply, actions)
+        actions_expanded, vectorized_elapsed = timed(Dashboard.expand_actions, actions)
+
+        pd.testing.assert_frame_equal(expected.astype(float), actions_expanded.astype(float), check_names=False)
+        print(f'{row_count:>8} {apply_elapsed:>10.3f} {vectorized_elapsed:>15.3f} {apply_elapsed / vectorized_elapsed:>6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
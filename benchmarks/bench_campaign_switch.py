@@ -0,0 +1,56 @@
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dash import no_update
+from plotly.utils import PlotlyJSONEncoder
+
+import Dashboard
+from mock_graph import mock_graph_url, start_mock_graph
+
+adset_count = 1000
+switches = 3
+layouts = {
+    'completo': (['spend', 'total_msg', 'cost_per_msg', 'funnel', 'campaigns', 'campaigns_names'],
+                 ['reach', 'impressions', 'frequency', 'CTR', 'clicks_link', 'cost_click', 'engagement', 'cost_engagement'],
+                 0),
+    'apresentacao': (['spend', 'total_msg', 'cost_per_msg'], [], 1),
+}
+
+
+def render_dashboard(campaign_value, main_metrics, secundary_metrics, presentation_clicks, data_store):
+    outputs = []
+    outputs += Dashboard.update_period(campaign_value, 'range', '2024-01-01', '2024-01-31', None, data_store)
+    outputs += Dashboard.update_main_metrics(campaign_value, main_metrics, main_metrics, data_store)
+    outputs += Dashboard.update_secundary_metrics(campaign_value, secundary_metrics, secundary_metrics, '100000', data_store)
+    outputs += Dashboard.update_campaigns_names(campaign_value, main_metrics, main_metrics, data_store)
+    outputs += Dashboard.update_table(campaign_value, presentation_clicks, 0, 30, [], '', presentation_clicks, data_store)
+    outputs += Dashboard.update_spend_graph(campaign_value, main_metrics, main_metrics, data_store)
+    outputs += Dashboard.update_msg_graph(campaign_value, main_metrics, main_metrics, data_store)
+    outputs += Dashboard.update_funnel_graph(campaign_value, main_metrics, main_metrics, data_store)
+    return [output for output in outputs if output is not no_update]
+
+
+def main():
+    server = start_mock_graph(adset_count=adset_count)
+    Dashboard.url_default = mock_graph_url(server)
+
+    print(f'{"layout":>13} {"campanha":>11} {"1a troca (ms)":>14} {"seguintes (ms)":>15} {"payload (KB)":>13}')
+    for layout_name, (main_metrics, secundary_metrics, presentation_clicks) in layouts.items():
+        outputs = Dashboard.get_data(lambda progress: None, 1, 'mock-token', 'act_1000', '100000', 'range', '2024-01-01', '2024-01-31', None, [])
+        for campaign_value in [option['value'] for option in outputs[2]]:
+            timings = []
+            for switch in range(switches):
+                start = time.perf_counter()
+                rendered = render_dashboard(campaign_value, main_metrics, secundary_metrics, presentation_clicks, outputs[4])
+                timings.append((time.perf_counter() - start) * 1000)
+            payload = len(json.dumps(rendered, cls=PlotlyJSONEncoder)) / 1024
+            print(f'{layout_name:>13} {campaign_value or "todas":>11} {timings[0]:>14.1f} {min(timings[1:]):>15.2f} {payload:>13.1f}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from plotly.utils import PlotlyJSONEncoder
+
+import Dashboard
+
+# Drives get_data and the dashboard callbacks end to end against mock_graph.py running in its own process, so
+# the wall time, peak memory (tracemalloc) and bytes measured here belong to the dashboard alone.
+# Usage: python benchmarks/bench_end_to_end.py [--adsets 10 1000 10000] [--save base.json] [--baseline base.json]
+
+main_metrics = ['spend', 'total_msg', 'cost_per_msg', 'funnel', 'campaigns', 'campaigns_names']
+secundary_metrics = ['reach', 'impressions', 'frequency', 'CTR', 'clicks_link', 'cost_click', 'engagement', 'cost_engagement']
+# Counts that should not move between runs; times and memory get the tolerance.
+exact_results = ['api_calls', 'upstream_bytes', 'payload_bytes']
+
+
+def start_mock_process(args):
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock_graph.py'), '--port', '0',
+               '--latency', str(args.latency), '--error-rate', str(args.error_rate)]
+    if args.max_page_size:
+        command += ['--max-page-size', str(args.max_page_size)]
+    if args.fixtures:
+        command += ['--fixtures', args.fixtures]
+    mock_process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    return mock_process, mock_process.stdout.readline().strip()
+
+
+def mock_control(mock_url, action, **query):
+    return requests.get(urlparse(mock_url)._replace(path=f'/__mock/{action}').geturl(), params=query, timeout=10).json()
+
+
+def clear_caches():
+    Dashboard.clear_graph_cache()
+    Dashboard.shared_cache.clear()
+    with Dashboard.dataset_registry_lock:
+        Dashboard.dataset_registry.clear()
+
+
+def payload_size(outputs):
+    return len(json.dumps(outputs, cls=PlotlyJSONEncoder))
+
+
+def run_views(data_store):
+    views = [
+        Dashboard.update_period('', 'range', '2024-01-01', '2024-01-31', None, data_store),
+        Dashboard.update_main_metrics('', main_metrics, main_metrics, data_store),
+        Dashboard.update_secundary_metrics('', secundary_metrics, secundary_metrics, '5000', data_store),
+        Dashboard.update_campaigns_names('', main_metrics, main_metrics, data_store),
+        Dashboard.update_table('', 0, 0, 30, [], '', 0, data_store),
+        Dashboard.update_spend_graph('', main_metrics, main_metrics, data_store),
+        Dashboard.update_msg_graph('', main_metrics, main_metrics, data_store),
+        Dashboard.update_funnel_graph('', main_metrics, main_metrics, data_store),
+    ]
+    return sum(payload_size(outputs) for outputs in views)
+
+
+def run_session(mock_url, adset_count):
+    clear_caches()
+    mock_control(mock_url, 'reset', adset_count=adset_count)
+    start = time.perf_counter()
+    get_data_outputs = Dashboard.get_data(lambda progress: None, 1, 'mock-token', 'act_1000', '5000', 'range', '2024-01-01', '2024-01-31', None, [])
+    get_data_elapsed = time.perf_counter() - start
+    mock_stats = mock_control(mock_url, 'stats')
+
+    result = {
+        'status': 'ok' if get_data_outputs[4] else 'erro',
+        'get_data_s': get_data_elapsed,
+        'api_calls': mock_stats['requests'],
+        'api_errors': mock_stats['errors'],
+        'upstream_bytes': mock_stats['bytes_sent'],
+        'views_s': 0.0,
+        'payload_bytes': payload_size(get_data_outputs),
+    }
+    if get_data_outputs[4]:
+        start = time.perf_counter()
+        result['payload_bytes'] += run_views(get_data_outputs[4])
+        result['views_s'] = time.perf_counter() - start
+    return result
+
+
+def measure(mock_url, adset_count):
+    result = run_session(mock_url, adset_count)
+    # tracemalloc slows every allocation down, so the peak comes from a second, untimed run.
+    tracemalloc.start()
+    run_session(mock_url, adset_count)
+    result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return result
+
+
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for adset_count, result in results.items():
+        expected = baseline.get(adset_count)
+        if expected is None:
+            continue
+        for name, value in result.items():
+            if name == 'status':
+                if value != expected[name]:
+                    regressions.append(f'{adset_count} adsets: status {expected[name]} -> {value}')
+            elif name in exact_results and value > expected[name]:
+                regressions.append(f'{adset_count} adsets: {name} {expected[name]} -> {value}')
+            elif name not in exact_results and name != 'api_errors' and value > expected[name] * (1 + tolerance) + 0.01:
+                regressions.append(f'{adset_count} adsets: {name} {expected[name]:.3f} -> {value:.3f}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ponta a ponta do dashboard contra a Graph API simulada')
+    parser.add_argument('--adsets', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--max-page-size', type=int, default=None)
+    parser.add_argument('--fixtures', default=None)
+    parser.add_argument('--save', default=None, help='grava os resultados como linha de base')
+    parser.add_argument('--baseline', default=None, help='compara com uma linha de base gravada e falha se piorar')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    mock_process, mock_url = start_mock_process(args)
+    Dashboard.url_default = mock_url
+    results = {}
+    try:
+        print(f'latencia simulada: {args.latency * 1000:.0f} ms, taxa de erro: {args.error_rate:.1%}')
+        print(f'{"adsets":>7} {"status":>6} {"get_data (s)":>13} {"views (s)":>10} {"chamadas":>9} {"erros":>6} {"api (KB)":>9} {"payload (KB)":>13} {"pico (MB)":>10}')
+        for adset_count in args.adsets:
+            result = measure(mock_url, adset_count)
+            results[str(adset_count)] = result
+            print(f'{adset_count:>7} {result["status"]:>6} {result["get_data_s"]:>13.3f} {result["views_s"]:>10.3f} {result["api_calls"]:>9} {result["api_errors"]:>6} '
+                  f'{result["upstream_bytes"] / 1024:>9.0f} {result["payload_bytes"] / 1024:>13.0f} {result["peak_mb"]:>10.1f}')
+    finally:
+        mock_process.kill()
+
+    if args.save:
+        with open(args.save, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = find_regressions(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSAO: {regression}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Dashboard
+from mock_graph import mock_graph_url, start_mock_graph
+
+adset_count = 2000
+latency = 0.02
+views = [
+    ('completo', ['spend', 'total_msg', 'cost_per_msg', 'funnel', 'campaigns', 'campaigns_names'],
+     ['reach', 'impressions', 'frequency', 'CTR', 'clicks_link', 'cost_click', 'engagement', 'cost_engagement'], 0),
+    ('apresentacao', ['spend', 'total_msg', 'cost_per_msg'], [], 1),
+    ('sem acoes', ['spend'], ['reach', 'impressions', 'frequency'], 1),
+]
+
+
+def load(server, main_metrics, secundary_metrics, presentation_clicks):
+    server.state.reset()
+    start = time.perf_counter()
+    outputs = Dashboard.get_data(lambda progress: None, 1, 'mock-token', 'act_1000', '100000', 'range', '2024-01-01', '2024-01-31', None, [],
+                                 main_metrics, secundary_metrics, presentation_clicks)
+    return outputs, time.perf_counter() - start
+
+
+def main():
+    server = start_mock_graph(adset_count=adset_count, latency=latency)
+    Dashboard.url_default = mock_graph_url(server)
+
+    print(f'{"visao":>13} {"requisicoes":>12} {"bytes recebidos":>16} {"tempo (s)":>10}   campos')
+    for name, main_metrics, secundary_metrics, presentation_clicks in views:
+        Dashboard.clear_graph_cache()
+        Dashboard.shared_cache.clear()
+        outputs, elapsed = load(server, main_metrics, secundary_metrics, presentation_clicks)
+        fields = Dashboard.get_dataset(outputs[4]['dataset_key']).attrs['fields']
+        print(f'{name:>13} {server.state.request_count:>12} {server.state.bytes_sent:>16} {elapsed:>10.3f}   {fields}')
+
+    print('visoes reduzidas depois de uma carga completa (servidas do cache):')
+    Dashboard.clear_graph_cache()
+    Dashboard.shared_cache.clear()
+    load(server, *views[0][1:])
+    for name, main_metrics, secundary_metrics, presentation_clicks in views[1:]:
+        outputs, elapsed = load(server, main_metrics, secundary_metrics, presentation_clicks)
+        print(f'{name:>13} {server.state.request_count:>12} {server.state.bytes_sent:>16} {elapsed:>10.3f}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
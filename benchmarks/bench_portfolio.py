@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Dashboard
+from mock_graph import mock_graph_url, start_mock_graph
+
+account_counts = [4, 12, 24]
+latency = 0.05
+account_latency = 0.01
+time_range = '{"since":"2024-01-01","until":"2024-01-31"}'
+
+
+def accounts_one_by_one(token_value, cliente_values):
+    portfolio_rows = []
+    for cliente_value in cliente_values:
+        portfolio_rows += Dashboard.get_portfolio_account(token_value, cliente_value, time_range)
+    return portfolio_rows
+
+
+def accounts_portfolio(token_value, cliente_values):
+    portfolio_rows, failed_values = Dashboard.get_portfolio_data(token_value, cliente_values, time_range)
+    assert not failed_values
+    return portfolio_rows
+
+
+def run(server, strategy, cliente_values):
+    server.state.reset()
+    Dashboard.clear_graph_cache()
+    Dashboard.shared_cache.clear()
+    start = time.perf_counter()
+    portfolio_rows = strategy('mock-token', cliente_values)
+    elapsed = time.perf_counter() - start
+    return Dashboard.build_portfolio_records(portfolio_rows, cliente_values, {}), server.state.request_count, elapsed
+
+
+def main():
+    server = start_mock_graph(adset_count=50, latency=latency, account_count=max(account_counts), account_latency=account_latency)
+    Dashboard.url_default = mock_graph_url(server)
+
+    print(f'latencia simulada: {latency * 1000:.0f} ms por requisicao + {account_latency * 1000:.0f} ms por indice de conta')
+    print(f'{"contas":>7} {"estrategia":>12} {"requisicoes":>12} {"tempo (s)":>10} {"conta mais lenta (s)":>21}')
+    for account_count in account_counts:
+        cliente_values = [f'act_{1000 + index}' for index in range(account_count)]
+        _, _, slowest = run(server, accounts_one_by_one, cliente_values[-1:])
+        expected = None
+        for name, strategy in [('uma por vez', accounts_one_by_one), ('portfolio', accounts_portfolio)]:
+            portfolio_records, request_count, elapsed = run(server, strategy, cliente_values)
+            expected = expected or portfolio_records
+            assert portfolio_records == expected
+            print(f'{account_count:>7} {name:>12} {request_count:>12} {elapsed:>10.3f} {slowest:>21.3f}')
+
+    total = expected[-1]
+    print(f'total de {len(expected) - 1} contas: investimento R$ {total["spend"]:.2f}, {total["total_msg"]} conversas, custo por conversa R$ {total["cost_per_msg"]:.2f}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Dashboard
+from mock_graph import mock_graph_url, start_mock_graph
+
+adset_count = 2000
+
+
+def main():
+    server = start_mock_graph(adset_count=adset_count, latency=0.02)
+    Dashboard.url_default = mock_graph_url(server)
+    Dashboard.report_poll_interval = 0.1
+
+    start = time.perf_counter()
+
+    def print_progress(message, percent=None):
+        print(f'{time.perf_counter() - start:>7.3f} s  {message:<55} {"" if percent is None else f"{percent:>3}%"}')
+
+    updated_json_content, updated_df = Dashboard.run_report_job('mock-token', 'act_1000', 'range', '2024-01-01', '2024-12-31', None, print_progress)
+
+    if updated_df is not None:
+        print(f'{len(updated_df)} linhas carregadas, {server.state.request_count} requisicoes')
+    else:
+        print(f'falhou: {updated_json_content}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
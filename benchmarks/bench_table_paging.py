@@ -0,0 +1,44 @@
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plotly.utils import PlotlyJSONEncoder
+
+import Dashboard
+from mock_graph import mock_graph_url, start_mock_graph
+
+adset_counts = [100, 1000, 5000]
+page_size = 30
+
+
+def timed_payload(render):
+    start = time.perf_counter()
+    rendered = render()
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000, len(json.dumps(rendered, cls=PlotlyJSONEncoder)) / 1024
+
+
+def main():
+    server = start_mock_graph()
+    Dashboard.url_default = mock_graph_url(server)
+
+    print(f'{"adsets":>7} {"tabela completa":>24} {"pagina":>22} {"ordenada e filtrada":>24}')
+    for adset_count in adset_counts:
+        server.state.reset(adset_count=adset_count)
+        Dashboard.clear_graph_cache()
+        Dashboard.shared_cache.clear()
+        outputs = Dashboard.get_data(lambda progress: None, 1, 'mock-token', 'act_1000', '100000', 'range', '2024-01-01', '2024-01-31', None, [])
+        entry = Dashboard.get_dataset_entry(outputs[4]['dataset_key'])
+
+        full = timed_payload(lambda: Dashboard.get_campaign_frame(entry, '').to_dict('records'))
+        page = timed_payload(lambda: Dashboard.update_table('', 0, 3, page_size, [], '', 0, outputs[4]))
+        sorted_page = timed_payload(lambda: Dashboard.update_table('', 0, 0, page_size, [{'column_id': 'spend', 'direction': 'desc'}], '{campaign_name} contains "1" && {spend} ge 50', 0, outputs[4]))
+        print(f'{adset_count:>7} ' + ' '.join(f'{elapsed:>10.1f} ms {payload:>7.1f} KB' for elapsed, payload in (full, page, sorted_page)))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
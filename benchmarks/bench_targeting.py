@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Dashboard
+from mock_graph import make_adset, mock_graph_url, start_mock_graph
+
+adset_counts = [10, 100, 300, 1000]
+latency = 0.02
+
+
+def targeting_per_adset(token_value, adset_ids):
+    for adset_id in adset_ids:
+        Dashboard.get_targeting_data(token_value, 'act_1000', adset_id)
+
+
+def targeting_batched(token_value, adset_ids):
+    Dashboard.get_targeting_data_batch(token_value, 'act_1000', adset_ids)
+
+
+def run(server, strategy, adset_count):
+    server.state.reset(adset_count=adset_count, latency=latency)
+    Dashboard.clear_graph_cache()
+    Dashboard.shared_cache.clear()
+    adset_ids = [make_adset(index)['adset_id'] for index in range(adset_count)]
+    start = time.perf_counter()
+    strategy('mock-token', adset_ids)
+    return server.state.request_count, time.perf_counter() - start
+
+
+def main():
+    server = start_mock_graph()
+    Dashboard.url_default = mock_graph_url(server)
+
+    print(f'latencia simulada por requisicao: {latency * 1000:.0f} ms')
+    print(f'{"adsets":>8} {"estrategia":>12} {"requisicoes":>12} {"tempo (s)":>10}')
+    for adset_count in adset_counts:
+        for name, strategy in [('por adset', targeting_per_adset), ('em lote', targeting_batched)]:
+            request_count, elapsed = run(server, strategy, adset_count)
+            print(f'{adset_count:>8} {name:>12} {request_count:>12} {elapsed:>10.3f}')
+
+    http_stats = Dashboard.get_http_stats()
+    print(f'conexoes abertas: {http_stats["connections"]} para {http_stats["requests"]} requisicoes (reuso {http_stats["reuse_ratio"]:.1%})')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
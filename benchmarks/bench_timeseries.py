@@ -0,0 +1,96 @@
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from plotly.utils import PlotlyJSONEncoder
+
+import Dashboard
+from mock_graph import mock_graph_url, start_mock_graph
+
+adset_counts = [10, 100, 300]
+since = '2024-01-01'
+until = '2024-12-30'
+latency = 0.02
+
+
+def lttb_reference(x, y, threshold):
+    # Textbook single-series LTTB, to check the vectorized version against.
+    bucket_size = (len(x) - 2) / (threshold - 2)
+    selected = [0]
+    for bucket in range(threshold - 2):
+        range_start = int(bucket * bucket_size) + 1
+        range_end = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, len(x))
+        next_x, next_y = x[range_end:next_end].mean(), y[range_end:next_end].mean()
+        previous = selected[-1]
+        areas = [abs((x[previous] - next_x) * (y[index] - y[previous]) - (x[previous] - x[index]) * (next_y - y[previous]))
+                 for index in range(range_start, range_end)]
+        selected.append(range_start + int(np.argmax(areas)))
+    return selected + [len(x) - 1]
+
+
+def check_lttb():
+    generator = np.random.default_rng(0)
+    x = np.arange(365, dtype='float64')
+    y = generator.random((365, 25)).cumsum(axis=0)
+    selected = Dashboard.downsample_lttb(x, y, 60)
+    for column in range(y.shape[1]):
+        assert list(selected[:, column]) == lttb_reference(x, y[:, column], 60)
+
+
+def build_graph(series_df, downsample):
+    point_budget = Dashboard.timeseries_point_budget
+    if not downsample:
+        Dashboard.timeseries_point_budget = series_df.size * 2
+    start = time.perf_counter()
+    timeseries_graph = Dashboard.build_timeseries_graph(series_df, 'spend', 'adset')
+    elapsed = time.perf_counter() - start
+    Dashboard.timeseries_point_budget = point_budget
+    points = sum(len(trace['x']) for trace in timeseries_graph['data'])
+    return points, len(json.dumps(timeseries_graph, cls=PlotlyJSONEncoder)), timeseries_graph['data'][0]['type'], elapsed
+
+
+def fetch_daily(server, adset_count, chunk_days):
+    server.state.reset(adset_count=adset_count, latency=latency)
+    Dashboard.clear_graph_cache()
+    Dashboard.shared_cache.clear()
+    Dashboard.timeseries_chunk_days = chunk_days
+    entry = {'data': pd.DataFrame(columns=['campaign_name'])}
+    entry['data'].attrs['daily_query'] = {'cliente': 'act_1000', 'time_range': f'{{"since":"{since}","until":"{until}"}}'}
+    start = time.perf_counter()
+    daily_df = Dashboard.get_daily_frame(entry, 'mock-token')
+    return daily_df, server.state.request_count, time.perf_counter() - start
+
+
+def main():
+    check_lttb()
+    server = start_mock_graph()
+    Dashboard.url_default = mock_graph_url(server)
+    chunk_days = Dashboard.timeseries_chunk_days
+
+    print(f'{since} a {until}, latencia simulada de {latency * 1000:.0f} ms por pagina')
+    print(f'{"adsets":>7} {"busca":>15} {"requisicoes":>12} {"tempo (s)":>10}')
+    for adset_count in adset_counts:
+        for name, days in [('periodo inteiro', 366), ('fatias mensais', chunk_days)]:
+            daily_df, request_count, elapsed = fetch_daily(server, adset_count, days)
+            print(f'{adset_count:>7} {name:>15} {request_count:>12} {elapsed:>10.3f}')
+
+    print()
+    print('uma serie por conjunto de anuncios')
+    print(f'{"adsets":>7} {"modo":>12} {"pontos":>8} {"tipo":>10} {"figura (KB)":>12} {"montagem (s)":>13}')
+    for adset_count in adset_counts:
+        daily_df, request_count, elapsed = fetch_daily(server, adset_count, chunk_days)
+        series_df = Dashboard.build_daily_series(daily_df, '', 'spend', 'adset', since, until)
+        for name, downsample in [('sem reducao', False), ('lttb', True)]:
+            points, figure_bytes, trace_type, elapsed = build_graph(series_df, downsample)
+            print(f'{adset_count:>7} {name:>12} {points:>8} {trace_type:>10} {figure_bytes / 1024:>12.0f} {elapsed:>13.3f}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
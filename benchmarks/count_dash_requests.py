@@ -0,0 +1,178 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_graph import mock_graph_url, start_mock_graph
+
+# Replays a typical session against the Flask server the way dash-renderer would: callbacks fire when their
+# inputs change, clientside callbacks run in node, and every POST to /_dash-update-component is counted.
+# Usage: python benchmarks/count_dash_requests.py [caminho/para/Dashboard.py]
+
+node_runner = '''
+const readline = require('readline');
+const no_update = {'__dash_no_update__': true};
+global.window = {dash_clientside: {no_update: no_update, callback_context: {triggered: []}}};
+%s
+readline.createInterface({input: process.stdin}).on('line', function(line) {
+    const call = JSON.parse(line);
+    window.dash_clientside.callback_context = {triggered: call.triggered.map(function(prop_id) { return {prop_id: prop_id, value: null}; })};
+    const result = window.dash_clientside._dashprivate_clientside_funcs[call.name].apply(null, call.args);
+    console.log(JSON.stringify(result));
+});
+'''
+
+session = [
+    ('abrir a pagina', []),
+    ('digitar o token', [('token-input', 'value', 'mock-token')]),
+    ('validar o token', [('token-button', 'n_clicks', 1)]),
+    ('escolher o cliente', [('client-dropdown', 'value', 'act_1000')]),
+    ('trocar para dia unico', [('interval-type', 'value', 'single_day')]),
+    ('voltar para intervalo', [('interval-type', 'value', 'range')]),
+    ('escolher as datas', [('date-range', 'start_date', '2024-01-01'), ('date-range', 'end_date', '2024-01-31')]),
+    ('digitar o alcance', [('reach-input', 'value', '5000')]),
+    ('enviar', [('submit-button', 'n_clicks', 1)]),
+    ('escolher uma campanha', [('campaign-dropdown', 'value', 'Campanha 1')]),
+    ('desmarcar o funil', [('main-metrics-checklist', 'value', ['spend', 'total_msg', 'cost_per_msg'])]),
+    ('remarcar o funil', [('main-metrics-checklist', 'value', ['spend', 'total_msg', 'cost_per_msg', 'funnel'])]),
+    ('desmarcar a frequencia', [('secundary-metrics-checklist', 'value', ['reach', 'impressions', 'CTR', 'clicks_link', 'cost_click', 'engagement', 'cost_engagement'])]),
+    ('remarcar a frequencia', [('secundary-metrics-checklist', 'value', ['reach', 'impressions', 'frequency', 'CTR', 'clicks_link', 'cost_click', 'engagement', 'cost_engagement'])]),
+    ('entrar no modo apresentacao', [('presentation-button', 'n_clicks', 1)]),
+    ('sair do modo apresentacao', [('presentation-button', 'n_clicks', 2)]),
+    ('voltar para todas as campanhas', [('campaign-dropdown', 'value', '')]),
+    ('proxima pagina da tabela', [('table', 'page_current', 1)]),
+    ('ordenar a tabela', [('table', 'sort_by', [{'column_id': 'spend', 'direction': 'desc'}])]),
+    ('filtrar a tabela', [('table', 'filter_query', '{campaign_name} contains "1"')]),
+]
+
+
+def load_dashboard(dashboard_path):
+    spec = importlib.util.spec_from_file_location('Dashboard', dashboard_path)
+    dashboard = importlib.util.module_from_spec(spec)
+    sys.modules['Dashboard'] = dashboard
+    spec.loader.exec_module(dashboard)
+    return dashboard
+
+
+def collect_props(component, props):
+    if isinstance(component, list):
+        for child in component:
+            collect_props(child, props)
+    elif isinstance(component, dict) and 'props' in component:
+        component_props = component['props']
+        if 'id' in component_props:
+            for prop_name, value in component_props.items():
+                props[(component_props['id'], prop_name)] = value
+        collect_props(component_props.get('children'), props)
+
+
+def parse_outputs(output):
+    specs = output[2:-2].split('...') if output.startswith('..') else [output]
+    return [tuple(spec.rsplit('.', 1)) for spec in specs]
+
+
+class Renderer:
+    def __init__(self, dashboard):
+        self.client = dashboard.app.server.test_client()
+        self.props = {}
+        collect_props(self.client.get('/_dash-layout').get_json(), self.props)
+        self.callbacks = self.client.get('/_dash-dependencies').get_json()
+        for callback in self.callbacks:
+            callback['outputs'] = parse_outputs(callback['output'])
+        self.node = subprocess.Popen(['node', '-e', node_runner % '\n'.join(dashboard.app._inline_scripts)],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        self.server_requests = 0
+        self.clientside_calls = 0
+
+    def dependents(self, changed_ids):
+        return [callback for callback in self.callbacks
+                if any(f'{item["id"]}.{item["property"]}' in changed_ids for item in callback['inputs'])]
+
+    def dispatch(self, changed_ids, pending=None):
+        pending = [(callback, set(changed_ids)) for callback in (pending or self.dependents(changed_ids))]
+        while pending:
+            pending_outputs = {(output_id, prop.split('@')[0]) for callback, triggered in pending for output_id, prop in callback['outputs']}
+            index = next((index for index, (callback, triggered) in enumerate(pending)
+                          if not any((item['id'], item['property']) in pending_outputs for item in callback['inputs'])), 0)
+            callback, triggered = pending.pop(index)
+            for changed_id in self.run(callback, sorted(triggered)):
+                for dependent in self.dependents({changed_id}):
+                    # Like dash-renderer, a callback is not triggered again by its own outputs.
+                    if dependent is callback:
+                        continue
+                    queued = next((item for item in pending if item[0] is dependent), None)
+                    if queued:
+                        queued[1].add(changed_id)
+                    else:
+                        pending.append((dependent, {changed_id}))
+
+    def values(self, items):
+        return [dict(item, value=self.props.get((item['id'], item['property']))) for item in items]
+
+    def apply(self, outputs):
+        changed_ids = []
+        for output_id, prop, value in outputs:
+            self.props[(output_id, prop)] = value
+            changed_ids.append(f'{output_id}.{prop}')
+        return changed_ids
+
+    def run(self, callback, triggered):
+        if callback['clientside_function']:
+            self.clientside_calls += 1
+            args = [item['value'] for item in self.values(callback['inputs']) + self.values(callback['state'])]
+            self.node.stdin.write(json.dumps({'name': callback['clientside_function']['function_name'], 'args': args, 'triggered': triggered}) + '\n')
+            self.node.stdin.flush()
+            result = json.loads(self.node.stdout.readline())
+            return self.apply([(output_id, prop.split('@')[0], value) for (output_id, prop), value in zip(callback['outputs'], result)
+                               if value != {'__dash_no_update__': True}])
+
+        body = {
+            'output': callback['output'],
+            'outputs': [{'id': output_id, 'property': prop} for output_id, prop in callback['outputs']],
+            'inputs': self.values(callback['inputs']),
+            'state': self.values(callback['state']),
+            'changedPropIds': triggered,
+        }
+        self.server_requests += 1
+        response = self.client.post('/_dash-update-component', json=body)
+        content = response.get_json() if response.status_code == 200 else {}
+        if 'cacheKey' in content:
+            query = f'?cacheKey={content["cacheKey"]}&job={content["job"]}'
+            while 'response' not in content:
+                time.sleep(callback['long']['interval'] / 1000)
+                self.server_requests += 1
+                response = self.client.post('/_dash-update-component' + query, json=body)
+                # A finished job whose outputs are all no_update answers 204, which ends the callback like dash-renderer does.
+                if response.status_code == 204:
+                    break
+                content = response.get_json() if response.status_code == 200 else {}
+        return self.apply([(output_id, prop, value) for output_id, output_props in content.get('response', {}).items()
+                           for prop, value in output_props.items()])
+
+
+def main():
+    dashboard_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Dashboard.py')
+    server = start_mock_graph(adset_count=50, account_count=3)
+    dashboard = load_dashboard(dashboard_path)
+    dashboard.url_default = mock_graph_url(server)
+    renderer = Renderer(dashboard)
+
+    print(f'{"acao":<32} {"servidor":>9} {"navegador":>10}')
+    for action, changes in session:
+        server_requests, clientside_calls = renderer.server_requests, renderer.clientside_calls
+        if changes:
+            renderer.dispatch(renderer.apply(changes))
+        else:
+            renderer.dispatch([], [callback for callback in renderer.callbacks if not callback['prevent_initial_call']])
+        print(f'{action:<32} {renderer.server_requests - server_requests:>9} {renderer.clientside_calls - clientside_calls:>10}')
+    print(f'{"total":<32} {renderer.server_requests:>9} {renderer.clientside_calls:>10}')
+    renderer.node.kill()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+import argparse
+import glob
+import json
+import os
+import random
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Stand-in for the Graph API: synthetic insights, targeting and ad accounts, or responses recorded with
+# record_fixtures.py, with configurable latency, page size and error rate.
+# Usage: python benchmarks/mock_graph.py [--port 8000] [--adsets 1000] [--latency 0.05] [--error-rate 0.01] [--fixtures pasta]
+# and point the dashboard at it with DASHBOARD_GRAPH_URL=http://127.0.0.1:8000/v19.0/
+
+api_version = 'v19.0'
+first_adset_id = 238000000000
+permission_error = {'error': {'message': '(#200) Ad account owner has NOT grant ads_management or ads_read permission', 'type': 'OAuthException', 'code': 200}}
+transient_error = {'message': 'An unexpected error has occurred. Please retry your request later.', 'type': 'OAuthException', 'is_transient': True, 'code': 2}
+
+
+def make_adset(index):
+    return {
+        'campaign_name': f'Campanha {index % 7}',
+        'adset_name': f'Conjunto {index:05d}',
+        'adset_id': f'{first_adset_id + index}',
+        'spend': f'{10 + index % 90}.{index % 100:02d}',
+        'cpc': '0.45',
+        'ctr': '1.80',
+        'clicks': str(40 + index % 60),
+        'impressions': str(2000 + index * 3),
+        'reach': str(1500 + index * 2),
+        'frequency': '1.30',
+        'actions': [
+            {'action_type': 'link_click', 'value': str(20 + index % 40)},
+            {'action_type': 'page_engagement', 'value': str(60 + index % 50)},
+            {'action_type': 'onsite_conversion.post_save', 'value': str(index % 5)},
+            {'action_type': 'onsite_conversion.messaging_conversation_started_7d', 'value': str(5 + index % 25)},
+        ],
+    }
+
+
+def make_row(index, date_start, date_stop):
+    row = make_adset(index)
+    row['date_start'] = date_start.isoformat()
+    row['date_stop'] = date_stop.isoformat()
+    return row
+
+
+def make_account_row(account_index, adset_count, date_start, date_stop):
+    # Account level: the account's adsets summed, each account offset so the ranking is not flat.
+    adsets = [make_adset(account_index * 7 + index) for index in range(adset_count)]
+    actions = {}
+    for adset in adsets:
+        for action in adset['actions']:
+            actions[action['action_type']] = actions.get(action['action_type'], 0) + int(action['value'])
+    return {
+        'account_id': str(1000 + account_index),
+        'account_name': 'Cliente Mock' if account_index == 0 else f'Cliente {account_index:04d}',
+        'spend': f'{sum(float(adset["spend"]) for adset in adsets):.2f}',
+        'impressions': str(sum(int(adset['impressions']) for adset in adsets)),
+        'reach': str(sum(int(adset['reach']) for adset in adsets)),
+        'clicks': str(sum(int(adset['clicks']) for adset in adsets)),
+        'actions': [{'action_type': action_type, 'value': str(value)} for action_type, value in actions.items()],
+        'date_start': date_start.isoformat(),
+        'date_stop': date_stop.isoformat(),
+    }
+
+
+def make_targeting(adset_id):
+    index = int(adset_id) - first_adset_id
+    targeting = {'age_min': 18 + index % 10, 'age_max': 45 + index % 20}
+    if index % 3:
+        targeting['genders'] = [index % 3]
+    return {'id': adset_id, 'name': f'Conjunto {index:05d}', 'targeting': targeting}
+
+
+report_run_steps = [
+    ('Job Not Started', 0),
+    ('Job Started', 0),
+    ('Job Running', 25),
+    ('Job Running', 60),
+    ('Job Running', 90),
+    ('Job Completed', 100),
+]
+
+
+def fixture_key(path, query):
+    parts = [part for part in path.split('/') if part and part != api_version]
+    return '/'.join(parts), tuple(sorted((key, str(value)) for key, value in query.items() if key != 'access_token'))
+
+
+def load_fixtures(fixture_dir):
+    fixtures = {}
+    for fixture_path in sorted(glob.glob(os.path.join(fixture_dir, '*.json'))):
+        with open(fixture_path) as fixture_file:
+            fixture = json.load(fixture_file)
+        fixtures[fixture_key(fixture['path'], fixture['query'])] = fixture['response']
+    return fixtures
+
+
+class MockGraphState:
+    def __init__(self, adset_count=10, latency=0.0, account_count=1, account_latency=0.0, error_rate=0.0, max_page_size=None, fixtures=None, seed=0, token_accounts=None):
+        self.adset_count = adset_count
+        self.account_count = account_count
+        # Tokens listed here see only the account indexes given; any other token sees every account.
+        self.token_accounts = token_accounts or {}
+        self.latency = latency
+        # Extra latency per account index on account-level insights, so each account is slower than the previous one.
+        self.account_latency = account_latency
+        self.error_rate = error_rate
+        # Graph caps the page size on its side whatever limit was asked for.
+        self.max_page_size = max_page_size
+        self.fixtures = fixtures or {}
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.error_count = 0
+        self.fixture_hits = 0
+        self.bytes_sent = 0
+        self.report_runs = {}
+        self.insights_log = []
+
+    def reset(self, adset_count=None, latency=None, error_rate=None):
+        with self.lock:
+            if adset_count is not None:
+                self.adset_count = adset_count
+            if latency is not None:
+                self.latency = latency
+            if error_rate is not None:
+                self.error_rate = error_rate
+            # Every run after a reset sees the same sequence of failures.
+            self.random = random.Random(self.seed)
+            self.request_count = 0
+            self.error_count = 0
+            self.fixture_hits = 0
+            self.bytes_sent = 0
+            self.insights_log = []
+
+    def stats(self):
+        with self.lock:
+            return {'requests': self.request_count, 'errors': self.error_count, 'fixture_hits': self.fixture_hits, 'bytes_sent': self.bytes_sent}
+
+    def should_fail(self):
+        with self.lock:
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.error_count += 1
+                return True
+            return False
+
+    def get_fixture(self, path, query):
+        response = self.fixtures.get(fixture_key(path, query))
+        if response is not None:
+            with self.lock:
+                self.fixture_hits += 1
+        return response
+
+    def count_request(self):
+        with self.lock:
+            self.request_count += 1
+
+    def count_bytes(self, body):
+        with self.lock:
+            self.bytes_sent += len(body)
+
+    def create_report_run(self):
+        with self.lock:
+            report_run_id = str(900000 + len(self.report_runs))
+            self.report_runs[report_run_id] = 0
+            return report_run_id
+
+    def poll_report_run(self, report_run_id):
+        with self.lock:
+            step = self.report_runs[report_run_id]
+            self.report_runs[report_run_id] = min(step + 1, len(report_run_steps) - 1)
+        async_status, percent = report_run_steps[step]
+        return {'id': report_run_id, 'async_status': async_status, 'async_percent_completion': percent}
+
+    def has_account(self, token_value, account_index):
+        return 0 <= account_index < self.account_count and account_index in self.token_accounts.get(token_value, range(self.account_count))
+
+    def has_adset(self, adset_id):
+        return adset_id.isdigit() and 0 <= int(adset_id) - first_adset_id < self.adset_count
+
+
+class MockGraphHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        state = self.server.state
+        parsed = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        parts = [part for part in parsed.path.split('/') if part and part != api_version]
+
+        # Control endpoints for a mock running in another process; not counted as Graph requests.
+        if parts == ['__mock', 'stats']:
+            self.send_json(state.stats(), counted=False)
+            return
+        if parts == ['__mock', 'reset']:
+            state.reset(**{key: (int if key == 'adset_count' else float)(value) for key, value in query.items()})
+            self.send_json(state.stats(), counted=False)
+            return
+
+        state.count_request()
+        if state.latency:
+            time.sleep(state.latency)
+        fixture = state.get_fixture(parsed.path, query) if state.fixtures else None
+
+        if 'access_token' not in query:
+            self.send_json({'error': {'message': 'An access token is required', 'code': 104}}, status=400)
+        elif state.should_fail():
+            self.send_json({'error': transient_error}, status=500)
+        elif fixture is not None:
+            self.send_json(self.replay_fixture(fixture))
+        elif not parts and 'ids' in query:
+            self.send_json(self.get_many(state, query['ids'].split(',')))
+        elif parts == ['me', 'adaccounts']:
+            self.send_json(self.get_accounts_page(state, parsed.path, query))
+        elif len(parts) == 2 and parts[1] == 'insights':
+            with state.lock:
+                state.insights_log.append((parts[0], query['access_token'], query.get('time_range')))
+            if parts[0].startswith('act_') and query['access_token'] in state.token_accounts and not state.has_account(query['access_token'], int(parts[0].replace('act_', '')) - 1000):
+                self.send_json(permission_error, status=403)
+            else:
+                self.send_json(self.get_insights_page(state, parsed.path, query))
+        elif len(parts) == 1 and parts[0] in state.report_runs:
+            self.send_json(state.poll_report_run(parts[0]))
+        elif len(parts) == 1 and state.has_adset(parts[0]):
+            self.send_json(make_targeting(parts[0]))
+        else:
+            self.send_json({'error': {'message': 'Unsupported get request', 'code': 100}}, status=400)
+
+    def do_POST(self):
+        state = self.server.state
+        state.count_request()
+        if state.latency:
+            time.sleep(state.latency)
+
+        parsed = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        parts = [part for part in parsed.path.split('/') if part and part != api_version]
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+        if 'access_token' not in query:
+            self.send_json({'error': {'message': 'An access token is required', 'code': 104}}, status=400)
+        elif state.should_fail():
+            self.send_json({'error': transient_error}, status=500)
+        elif len(parts) == 2 and parts[1] == 'insights':
+            self.send_json({'report_run_id': state.create_report_run()})
+        else:
+            self.send_json({'error': {'message': 'Unsupported post request', 'code': 100}}, status=400)
+
+    def get_insights_page(self, state, path, query):
+        time_range = json.loads(query.get('time_range', '{"since":"2024-01-01","until":"2024-01-30"}'))
+        since = date.fromisoformat(time_range['since'])
+        until = date.fromisoformat(time_range['until'])
+        if query.get('time_increment') == '1':
+            periods = [(since + timedelta(days=offset),) * 2 for offset in range((until - since).days + 1)]
+        else:
+            periods = [(since, until)]
+
+        if query.get('level') == 'account':
+            account_index = int(path.rstrip('/').split('/')[-2].replace('act_', '')) - 1000
+            if not 0 <= account_index < state.account_count:
+                return {'error': {'message': 'Unsupported get request', 'code': 100}}
+            time.sleep(state.account_latency * account_index)
+            rows = [make_account_row(account_index, state.adset_count, since, until)]
+            if 'fields' in query:
+                fields = set(query['fields'].split(',')) | {'date_start', 'date_stop'}
+                rows = [{field: value for field, value in row.items() if field in fields} for row in rows]
+            return {'data': rows, 'paging': {'cursors': {'before': '0', 'after': '1'}}}
+
+        row_count = state.adset_count * len(periods)
+        limit = min(int(query.get('limit', 25)), state.max_page_size or float('inf'))
+        start = int(query.get('after', 0))
+        end = min(start + limit, row_count)
+        rows = [make_row(row % state.adset_count, *periods[row // state.adset_count]) for row in range(start, end)]
+        if 'fields' in query:
+            fields = set(query['fields'].split(',')) | {'date_start', 'date_stop'}
+            rows = [{field: value for field, value in row.items() if field in fields} for row in rows]
+        page = {
+            'data': rows,
+            'paging': {'cursors': {'before': str(start), 'after': str(end)}},
+        }
+        if end < row_count:
+            page['paging']['next'] = f'http://{self.headers["Host"]}{path}?limit={limit}&after={end}'
+        return page
+
+    def get_accounts_page(self, state, path, query):
+        limit = int(query.get('limit', 25))
+        start = int(query.get('after', 0))
+        account_indexes = [index for index in range(state.account_count) if state.has_account(query['access_token'], index)]
+        end = min(start + limit, len(account_indexes))
+        page = {
+            'data': [{'name': 'Cliente Mock' if index == 0 else f'Cliente {index:04d}', 'id': f'act_{1000 + index}'} for index in account_indexes[start:end]],
+            'paging': {'cursors': {'before': str(start), 'after': str(end)}},
+        }
+        if end < len(account_indexes):
+            page['paging']['next'] = f'http://{self.headers["Host"]}{path}?limit={limit}&after={end}'
+        return page
+
+    def get_many(self, state, ids):
+        if len(ids) > 50:
+            return {'error': {'message': 'Too many IDs. Maximum: 50', 'code': 100}}
+        return {adset_id: make_targeting(adset_id) for adset_id in ids if state.has_adset(adset_id)}
+
+    def replay_fixture(self, fixture):
+        # Recorded next links point at graph.facebook.com; the dashboard only reads the cursors, but keep them local.
+        next_page = fixture.get('paging', {}).get('next') if isinstance(fixture, dict) else None
+        if next_page:
+            fixture = dict(fixture, paging=dict(fixture['paging'], next=urlparse(next_page)._replace(scheme='http', netloc=self.headers['Host']).geturl()))
+        return fixture
+
+    def send_json(self, content, status=200, counted=True):
+        body = json.dumps(content).encode()
+        if counted:
+            self.server.state.count_bytes(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def create_mock_graph(port=0, **state_options):
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockGraphHandler)
+    server.daemon_threads = True
+    server.state = MockGraphState(**state_options)
+    return server
+
+
+def start_mock_graph(adset_count=10, latency=0.0, account_count=1, account_latency=0.0, **state_options):
+    server = create_mock_graph(adset_count=adset_count, latency=latency, account_count=account_count, account_latency=account_latency, **state_options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def mock_graph_url(server):
+    return f'http://127.0.0.1:{server.server_address[1]}/{api_version}/'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor local que imita a Graph API do Meta')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--adsets', type=int, default=10)
+    parser.add_argument('--accounts', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0, help='segundos por requisicao')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fracao das requisicoes que falham com erro transitorio')
+    parser.add_argument('--max-page-size', type=int, default=None)
+    parser.add_argument('--fixtures', default=None, help='pasta com respostas gravadas por record_fixtures.py')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = create_mock_graph(args.port, adset_count=args.adsets, account_count=args.accounts, latency=args.latency, error_rate=args.error_rate,
+                               max_page_size=args.max_page_size, fixtures=load_fixtures(args.fixtures) if args.fixtures else None, seed=args.seed)
+    print(mock_graph_url(server), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import hashlib
+import json
+import os
+import sys
+from urllib.parse import parse_qs, urlencode, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Dashboard
+from mock_graph import api_version
+
+# Records every Graph API response of one real dashboard session, so mock_graph.py --fixtures can replay it
+# without credentials. Tokens are removed from the recorded requests and paging links.
+# Usage: DASHBOARD_RECORD_TOKEN=... python benchmarks/record_fixtures.py act_123 2024-01-01 2024-01-31 pasta
+
+
+def scrub_paging(content):
+    next_page = content.get('paging', {}).get('next') if isinstance(content, dict) else None
+    if not next_page:
+        return content
+    parsed = urlparse(next_page)
+    query = {key: values[0] for key, values in parse_qs(parsed.query).items() if key != 'access_token'}
+    return dict(content, paging=dict(content['paging'], next=parsed._replace(query=urlencode(query)).geturl()))
+
+
+def record_responses(fixture_dir):
+    graph_get = Dashboard.graph_get
+
+    def recording_graph_get(helper, updated_url, params):
+        updated_response = graph_get(helper, updated_url, params)
+        path = '/'.join(part for part in urlparse(updated_url).path.split('/') if part and part != api_version)
+        query = {key: str(value) for key, value in params.items() if key != 'access_token'}
+        fixture = {'path': path, 'query': query, 'response': scrub_paging(updated_response.json())}
+        fixture_name = hashlib.sha256(json.dumps([path, sorted(query.items())]).encode()).hexdigest()[:16]
+        with open(os.path.join(fixture_dir, f'{fixture_name}.json'), 'w') as fixture_file:
+            json.dump(fixture, fixture_file)
+        return updated_response
+
+    Dashboard.graph_get = recording_graph_get
+
+
+def main():
+    cliente_value, start_date, end_date, fixture_dir = sys.argv[1:5]
+    token_value = os.environ['DASHBOARD_RECORD_TOKEN']
+    os.makedirs(fixture_dir, exist_ok=True)
+    Dashboard.clear_graph_cache()
+    Dashboard.shared_cache.clear()
+    record_responses(fixture_dir)
+
+    Dashboard.show_client_field(1, token_value)
+    feedback_msg = Dashboard.get_data(lambda progress: None, 1, token_value, cliente_value, '1', 'range', start_date, end_date, None, [])[0]
+    print(feedback_msg.children)
+    print(f'{len(os.listdir(fixture_dir))} respostas gravadas em {fixture_dir}')
+
+
+if __name__ == '__main__':
+    main()
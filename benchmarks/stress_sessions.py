@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Dashboard
+from mock_graph import mock_graph_url, start_mock_graph
+
+session_count = 32
+rounds = 5
+
+
+def session_query(session, round_index):
+    since = date(2024, 1, 1) + timedelta(days=session)
+    until = since + timedelta(days=round_index + 1)
+    return f'token-{session:02d}', f'act_{2000 + session}', since.isoformat(), until.isoformat()
+
+
+def run_session(session):
+    mismatches = []
+    for round_index in range(rounds):
+        token_value, cliente_value, start_date, end_date = session_query(session, round_index)
+        outputs = Dashboard.get_data(lambda progress: None, 1, token_value, cliente_value, '1000', 'range', start_date, end_date, None, [])
+        period = Dashboard.update_period('', 'range', start_date, end_date, None, outputs[4])
+        expected_dates = [f'{day[8:10]}/{day[5:7]}/{day[0:4]}' for day in (start_date, end_date)]
+        if period != expected_dates:
+            mismatches.append((session, round_index, period, expected_dates))
+    return mismatches
+
+
+def main():
+    server = start_mock_graph(adset_count=120, latency=0.005)
+    Dashboard.url_default = mock_graph_url(server)
+    Dashboard.max_queued_jobs = session_count
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=session_count) as executor:
+        mismatches = [mismatch for result in executor.map(run_session, range(session_count)) for mismatch in result]
+    elapsed = time.perf_counter() - start
+
+    expected = {}
+    for session in range(session_count):
+        for round_index in range(rounds):
+            token_value, cliente_value, start_date, end_date = session_query(session, round_index)
+            expected.setdefault(cliente_value, {'tokens': {token_value}, 'ranges': set()})
+            expected[cliente_value]['ranges'].add(f'{{"since":"{start_date}","until":"{end_date}"}}')
+    leaked_requests = [
+        (cliente_value, token_value, time_range)
+        for cliente_value, token_value, time_range in server.state.insights_log
+        if token_value not in expected[cliente_value]['tokens'] or time_range not in expected[cliente_value]['ranges']
+    ]
+
+    print(f'{session_count} sessoes x {rounds} rodadas em {elapsed:.2f} s, {server.state.request_count} requisicoes')
+    print(f'requisicoes de insights com token ou periodo de outra sessao: {len(leaked_requests)}')
+    print(f'dashboards com periodo de outra sessao: {len(mismatches)}')
+    server.shutdown()
+    if leaked_requests or mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
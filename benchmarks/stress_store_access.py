@@ -0,0 +1,49 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Dashboard
+from mock_graph import mock_graph_url, start_mock_graph
+
+# Fills the daily SQLite store with one token and then asks for the same days with a token that does not list the
+# account: every stored row must be refused and the second token must get the Graph API error instead.
+# Usage: python benchmarks/stress_store_access.py
+
+owner_token = 'good-token'
+other_token = 'attacker-token'
+cliente_value = 'act_1000'
+start_date, end_date = '2024-01-01', '2024-01-05'
+
+
+def read_store(token_value):
+    rows, errors = 0, 0
+    for updated_json_content in Dashboard.iter_stored_data(token_value, cliente_value, 'range', start_date, end_date, None):
+        if Dashboard.process_error(updated_json_content):
+            errors += 1
+        else:
+            rows += len(updated_json_content['data'])
+    return rows, errors
+
+
+def main():
+    server = start_mock_graph(adset_count=20, account_count=2, token_accounts={other_token: [1]})
+    Dashboard.url_default = mock_graph_url(server)
+    Dashboard.insights_store_path = os.path.join(tempfile.mkdtemp(), 'insights.sqlite3')
+
+    owner_rows, owner_errors = read_store(owner_token)
+    Dashboard.clear_graph_cache()
+    server.state.reset()
+    other_rows, other_errors = read_store(other_token)
+    other_requests = sum(1 for account, token_value, time_range in server.state.insights_log if token_value == other_token)
+
+    print(f'linhas do token com acesso: {owner_rows} ({owner_errors} erros)')
+    print(f'linhas do token sem acesso: {other_rows} ({other_errors} erros, {other_requests} requisicoes de insights)')
+    server.shutdown()
+    if not owner_rows or other_rows or not other_errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+import glob
+import os
+import tempfile
+
+# Picked up by `gunicorn Dashboard:server` from this directory. PROMETHEUS_MULTIPROC_DIR is required: get_data,
+# update_portfolio and update_timeseries_graph run in processes forked for each job, and only the samples they
+# write there reach /metrics. It has to be set before prometheus_client is imported, so it defaults here, before
+# any worker loads the app; export it to put the samples somewhere else.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(os.environ.get('DASHBOARD_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'dashboard-zeroum')), 'prometheus'))
+
+from prometheus_client import multiprocess
+
+
+def on_starting(server):
+    # Samples left by a previous run would be added to the new ones.
+    multiproc_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(multiproc_dir, exist_ok=True)
+    for sample_path in glob.glob(os.path.join(multiproc_dir, '*.db')):
+        os.remove(sample_path)
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)